@@ -1,79 +1,30 @@
 import streamlit as st
-import pandas as pd
-import json, os, hashlib, random, time
-from datetime import datetime, timezone
+import os, io, re, random, time
+from storage import open_storage, adopt_legacy_layout, partition_name
+from autoadvance import PHASE_TABLES
+from presence import registry_for
+from engine import game_for, FlushError
+import packs
+import media
+import scoring
+import profiling
+from profiling import profiled
 
 st.set_page_config(page_title="Quiz Night – Sync Pro", page_icon="🕹️", layout="centered")
 
-DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
-QUESTIONS_CSV = os.path.join(DATA_DIR, "questions.csv")
-ANSWERS_CSV = os.path.join(DATA_DIR, "answers.csv")
-RATINGS_CSV = os.path.join(DATA_DIR, "ratings.csv")
-PLAYERS_CSV = os.path.join(DATA_DIR, "players.csv")
-STATE_JSON = os.path.join(DATA_DIR, "state.json")
+DATA_DIR = os.environ.get("QUIZ_DATA_DIR") or os.path.join(os.path.dirname(__file__), "data")
+STORAGE_BACKEND = os.environ.get("QUIZ_STORAGE", "csv")  # csv | sqlite
+DEFAULT_ROOM = "MAIN"   # Räume liegen unter data/<RAUM>/
 
 HEARTBEAT_SEC = 2       # Präsenz-Schreibintervall
-SYNC_TICK_SEC = 0.25    # UI-Refresh-Intervall
-
-# ---------- Helpers & State ----------
-def ensure_files():
-    os.makedirs(DATA_DIR, exist_ok=True)
-    if not os.path.exists(QUESTIONS_CSV):
-        pd.DataFrame(columns=["id","round_id","author","question","correct","wrong1","wrong2","wrong3","difficulty","created_at"]).to_csv(QUESTIONS_CSV, index=False)
-    if not os.path.exists(ANSWERS_CSV):
-        pd.DataFrame(columns=["timestamp","round_id","player","question_id","answer","is_correct"]).to_csv(ANSWERS_CSV, index=False)
-    if not os.path.exists(RATINGS_CSV):
-        pd.DataFrame(columns=["timestamp","round_id","player","question_id","stars"]).to_csv(RATINGS_CSV, index=False)
-    if not os.path.exists(PLAYERS_CSV):
-        pd.DataFrame(columns=["round_id","player","joined_at","last_seen","phase"]).to_csv(PLAYERS_CSV, index=False)
-    else:
-        # Falls aus älteren Versionen ohne "phase"
-        df = pd.read_csv(PLAYERS_CSV)
-        if "phase" not in df.columns:
-            df["phase"] = ""
-            df.to_csv(PLAYERS_CSV, index=False)
-    if not os.path.exists(STATE_JSON):
-        init_state = {
-            "round_id": 0,
-            "phase": "lobby",  # lobby | write | answer | reveal | rate | results
-            "phase_started_at": None,
-            "question_order": [],
-            "current_q_idx": 0,
-            "host": {"name": None, "pin_hash": None},
-            "last_update": datetime.utcnow().isoformat() + "Z",  # jede Änderung erhöht das
-            "sync_nonce": 0,   # Host kann erhöhen ⇒ Clients erzwingen 1x neu ziehen
-        }
-        with open(STATE_JSON, "w", encoding="utf-8") as f:
-            json.dump(init_state, f)
-
-ensure_files()
-
-def load_df(path):
-    # bewusst ohne Cache für harte Synchronisation
-    return pd.read_csv(path) if os.path.exists(path) else pd.DataFrame()
-
-def save_df(df, path):
-    df.to_csv(path, index=False)
-
-def load_state():
-    with open(STATE_JSON, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_state(state):
-    state["last_update"] = datetime.utcnow().isoformat() + "Z"
-    with open(STATE_JSON, "w", encoding="utf-8") as f:
-        json.dump(state, f)
-
-def utc_now_iso():
-    return datetime.utcnow().isoformat()
-
-def iso_to_ts(iso):
-    try:
-        # strip Z if present
-        s = iso.replace("Z","")
-        return datetime.fromisoformat(s).timestamp()
-    except Exception:
-        return 0.0
+SYNC_TICK_SEC = 0.25    # Pause zwischen zwei Warte-Zyklen des Sync-Watchers
+SYNC_WAIT_SEC = 0.2     # so lange blockiert der Watcher auf eine Änderung (hält auch Klicks auf)
+
+# ---------- Helpers ----------
+# Spiellogik, Phasen und Wertung stecken in engine.py; hier nur die Ansicht.
+def normalize_room(code):
+    code = re.sub(r"[^A-Z0-9]", "", str(code or "").upper())
+    return code if 2 <= len(code) <= 16 else ""
 
 # ---------- Session identity ----------
 if "player_name" not in st.session_state:
@@ -84,10 +35,32 @@ if "logged_in" not in st.session_state:
     st.session_state["logged_in"] = False
 if "last_presence_write" not in st.session_state:
     st.session_state["last_presence_write"] = 0.0
+if "last_presence_phase" not in st.session_state:
+    st.session_state["last_presence_phase"] = ""
 if "last_update_seen" not in st.session_state:
     st.session_state["last_update_seen"] = ""
 if "sync_nonce_seen" not in st.session_state:
     st.session_state["sync_nonce_seen"] = 0
+if "profile_sid" not in st.session_state:
+    st.session_state["profile_sid"] = "%08x" % random.getrandbits(32)
+if "room" not in st.session_state:
+    st.session_state["room"] = normalize_room(st.query_params.get("room", "")) or DEFAULT_ROOM
+
+# ---------- Room ----------
+# Jeder Raum hat eigenen State, eigene Tabellen, eigenen Cache und eigene Präsenz;
+# Änderungen in einem Raum wecken nur dessen Sessions.
+ROOM = st.session_state["room"]
+ROOM_DIR = os.path.join(DATA_DIR, ROOM)
+# gesampelt: eine JSON-Zeile pro Rerun in data/<RAUM>/requests.jsonl
+profiling.begin_rerun(os.path.join(ROOM_DIR, "requests.jsonl"), session=st.session_state["profile_sid"],
+                      room=ROOM, player=st.session_state["player_name"])
+if ROOM == DEFAULT_ROOM:
+    adopt_legacy_layout(DATA_DIR, ROOM_DIR)
+STORAGE = open_storage(ROOM_DIR, STORAGE_BACKEND)
+GAME = game_for(STORAGE)
+GAME.ensure()
+PRESENCE = registry_for(STORAGE)
+load_state = GAME.load_state
 
 # ---------- Styles ----------
 PHASE_COLORS = {
@@ -123,29 +96,31 @@ def update_presence(phase_for_player):
     if not st.session_state.get("logged_in"): 
         return
     now_ts = time.time()
-    if now_ts - st.session_state["last_presence_write"] < HEARTBEAT_SEC:
+    if (now_ts - st.session_state["last_presence_write"] < HEARTBEAT_SEC
+            and st.session_state.get("last_presence_phase") == phase_for_player):
         return
     st.session_state["last_presence_write"] = now_ts
+    st.session_state["last_presence_phase"] = phase_for_player
     state = load_state()
-    pdf = load_df(PLAYERS_CSV)
-    if pdf.empty:
-        row = {"round_id": state["round_id"], "player": st.session_state["player_name"], "joined_at": utc_now_iso(), "last_seen": utc_now_iso(), "phase": phase_for_player}
-        save_df(pd.DataFrame([row]), PLAYERS_CSV)
-        return
-    # ensure columns
-    if "phase" not in pdf.columns:
-        pdf["phase"] = ""
-    mask = (pdf["round_id"] == state["round_id"]) & (pdf["player"] == st.session_state["player_name"])
-    if mask.any():
-        pdf.loc[mask, "last_seen"] = utc_now_iso()
-        pdf.loc[mask, "phase"] = phase_for_player
-    else:
-        row = {"round_id": state["round_id"], "player": st.session_state["player_name"], "joined_at": utc_now_iso(), "last_seen": utc_now_iso(), "phase": phase_for_player}
-        pdf = pd.concat([pdf, pd.DataFrame([row])], ignore_index=True)
-    save_df(pdf, PLAYERS_CSV)
+    PRESENCE.beat(state["round_id"], st.session_state["player_name"], phase_for_player, now_ts)
 
 # ---------- Sidebar: identity & host ----------
 with st.sidebar:
+    st.header("Raum")
+    room_input = st.text_input("Raum-Code", value=ROOM)
+    if st.button("Raum wechseln"):
+        code = normalize_room(room_input)
+        if not code:
+            st.error("Raum-Code: 2–16 Buchstaben oder Ziffern.")
+        elif code != ROOM:
+            st.session_state["room"] = code
+            st.session_state["is_host"] = False  # Host-PIN gilt pro Raum
+            st.session_state["last_update_seen"] = ""
+            st.session_state["last_presence_phase"] = ""
+            st.query_params["room"] = code
+            st.rerun()
+
+    st.divider()
     st.header("Spieler")
     name_input = st.text_input("Dein Name", value=st.session_state["player_name"]).strip()
     c1, c2 = st.columns(2)
@@ -174,7 +149,7 @@ with st.sidebar:
     if state["host"]["name"] and not st.session_state["is_host"]:
         pin_try = st.text_input("Host-PIN", type="password")
         if st.button("Als Host anmelden"):
-            if state["host"]["pin_hash"] and hashlib.sha256(pin_try.encode()).hexdigest() == state["host"]["pin_hash"]:
+            if GAME.check_pin(pin_try):
                 st.session_state["is_host"] = True
                 st.success("Host-Modus aktiv.")
                 st.rerun()
@@ -187,9 +162,7 @@ with st.sidebar:
             if not new_host_name or not new_pin:
                 st.error("Bitte Name und PIN eingeben.")
             else:
-                state["host"]["name"] = new_host_name
-                state["host"]["pin_hash"] = hashlib.sha256(new_pin.encode()).hexdigest()
-                save_state(state)
+                GAME.create_host(new_host_name, new_pin)
                 st.session_state["is_host"] = True
                 st.success("Host erstellt und angemeldet.")
                 st.rerun()
@@ -200,123 +173,122 @@ with st.sidebar:
             st.rerun()
 
 # ---------- Host controls (manual; no timers) ----------
-def start_phase(phase):
-    state = load_state()
-    state["phase"] = phase
-    state["phase_started_at"] = utc_now_iso() + "Z"
-    save_state(state)
-
-def reset_round(new_round=True):
-    state = load_state()
-    if new_round:
-        state["round_id"] += 1
-    state["phase"] = "lobby"
-    state["phase_started_at"] = None
-    state["question_order"] = []
-    state["current_q_idx"] = 0
-    save_state(state)
-
-def prepare_questions_for_round():
-    state = load_state()
-    qdf = load_df(QUESTIONS_CSV)
-    qids = qdf[qdf["round_id"] == state["round_id"]]["id"].tolist()
-    random.shuffle(qids)
-    state["question_order"] = qids
-    state["current_q_idx"] = 0
-    save_state(state)
-    return qids
-
 def advance():
-    state = load_state()
-    if state["phase"] == "write":
-        qids = prepare_questions_for_round()
-        if len(qids) == 0:
+    # False, wenn die Phase wegen eines Schreibfehlers bleibt (Meldung bleibt dann stehen)
+    try:
+        if GAME.advance() is None:
             st.warning("Es gibt noch keine Fragen in dieser Runde.")
-            return
-        start_phase("answer")
-    elif state["phase"] == "answer":
-        start_phase("reveal")
-    elif state["phase"] == "reveal":
-        start_phase("rate")
-    elif state["phase"] == "rate":
-        if state["current_q_idx"] + 1 < len(state["question_order"]):
-            state["current_q_idx"] += 1
-            save_state(state)
-            start_phase("answer")
-        else:
-            start_phase("results")
-
-def force_sync():
-    state = load_state()
-    state["sync_nonce"] = int(state.get("sync_nonce", 0)) + 1
-    save_state(state)
+    except FlushError as e:
+        st.error(f"{e}. Bitte erneut versuchen.")
+        return False
+    return True
 
 def host_controls():
     st.write("")
     c1, c2, c3, c4 = st.columns(4)
     with c1:
         if st.button("▶️ Weiter", use_container_width=True):
-            advance(); st.rerun()
+            if advance(): st.rerun()
     with c2:
         if st.button("🔁 Runde neu", use_container_width=True):
-            reset_round(new_round=False); st.rerun()
+            GAME.reset_round(new_round=False); st.rerun()
     with c3:
         if st.button("🆕 Neue Runde", use_container_width=True):
-            reset_round(new_round=True); st.rerun()
+            GAME.reset_round(new_round=True); st.rerun()
     with c4:
         if st.button("🛰 Force Sync", use_container_width=True):
-            force_sync(); st.rerun()
+            GAME.force_sync(); st.rerun()
+    # Auto-Weiter: in answer/rate schaltet die Engine selbst, wenn alle aktiven Spieler
+    # (außer dem Autor) fertig sind oder die Frist abläuft
+    auto = load_state().get("auto_advance") or {}
+    a1, a2 = st.columns(2)
+    with a1:
+        enabled = st.checkbox("⏩ Auto-Weiter", value=bool(auto.get("enabled")))
+    with a2:
+        deadline = st.number_input("Frist in s (0 = keine)", min_value=0, max_value=3600, step=5,
+                                   value=int(auto.get("deadline_sec") or 0))
+    if enabled != bool(auto.get("enabled")) or deadline != int(auto.get("deadline_sec") or 0):
+        GAME.set_auto_advance(enabled, deadline); st.rerun()
+
+def host_pack_import():
+    # Nur vor der Antwort-Phase: das Deck der Runde wird beim Wechsel nach answer eingefroren
+    state = load_state()
+    with st.expander("📦 Fragenpaket importieren (CSV/JSONL)"):
+        if state["round_id"] == 0:
+            st.caption("Erst die Runde starten."); return
+        st.caption("Spalten: question, correct, wrong1 (Pflicht), wrong2, wrong3, difficulty.")
+        up = st.file_uploader("Paket", type=["csv", "jsonl", "ndjson", "json"])
+        author = st.text_input("Autor im Spiel", value=f"📦 {os.path.splitext(up.name)[0]}" if up else "📦 Paket")
+        if up is not None and st.button("Importieren"):
+            try:
+                report = GAME.import_pack(io.TextIOWrapper(up, encoding="utf-8-sig", newline=""),
+                                          author.strip() or "📦 Paket", packs.pack_format(up.name))
+            except ValueError as e:  # zu groß, falsche Kodierung, kaputte Datei
+                st.error(f"Import abgebrochen: {e}"); return
+            st.success(f"{report['imported']} Fragen in Runde {state['round_id']} importiert ({report['ms']:.0f} ms)"
+                       + (f", davon {report['similar']} ähnlich zu früheren." if report["similar"] else "."))
+            if report["error_count"]:
+                st.warning(f"{report['error_count']} Zeilen übersprungen:\n" +
+                           "\n".join(f"- Zeile {line}: {err}" for line, err in report["errors"]))
 
 # ---------- Lobby list with active dots ----------
 def lobby_list():
     state = load_state()
-    pdf = load_df(PLAYERS_CSV)
-    names = []
-    if not pdf.empty:
-        # ensure columns
-        for col in ["phase","last_seen"]:
-            if col not in pdf.columns:
-                pdf[col] = ""
-        # active if last_seen <= 10s ago
-        now_ts = time.time()
-        rows = pdf[pdf["round_id"] == state["round_id"]][["player","last_seen","phase"]].dropna().drop_duplicates()
-        chips = []
-        me = st.session_state["player_name"] if st.session_state.get("logged_in") else ""
-        for _, r in rows.iterrows():
-            p = str(r["player"])
-            ls = str(r["last_seen"])
-            ph = str(r["phase"])
-            active = (now_ts - iso_to_ts(ls)) <= 10.0
-            dot_cls = "green" if active else "gray"
-            cls = "playerchip me" if me and p == me else "playerchip"
-            chips.append(f"<span class='{cls}'><span class='dot {dot_cls}'></span>{p}</span>")
-        if chips:
-            st.markdown(" ".join(chips), unsafe_allow_html=True)
-        else:
-            st.caption("Noch keine Spieler in der Lobby.")
+    now_ts = time.time()
+    me = st.session_state["player_name"] if st.session_state.get("logged_in") else ""
+    chips = []
+    for rec in PRESENCE.players(state["round_id"]):
+        dot_cls = "green" if rec.is_active(now_ts) else "gray"
+        cls = "playerchip me" if me and rec.player == me else "playerchip"
+        chips.append(f"<span class='{cls}'><span class='dot {dot_cls}'></span>{rec.player}</span>")
+    if chips:
+        st.markdown(" ".join(chips), unsafe_allow_html=True)
     else:
         st.caption("Noch keine Spieler in der Lobby.")
 
 # ---------- Sync dashboard (Host only) ----------
 def host_sync_dashboard():
     state = load_state()
-    pdf = load_df(PLAYERS_CSV)
-    if pdf.empty:
+    total = len(PRESENCE.players(state["round_id"]))
+    if total == 0:
         st.info("Keine Spieler erfasst.")
         return
-    now_ts = time.time()
     cur_phase = state["phase"]
-    # ensure columns
-    if "phase" not in pdf.columns: pdf["phase"] = ""
-    if "last_seen" not in pdf.columns: pdf["last_seen"] = ""
-    sub = pdf[pdf["round_id"] == state["round_id"]].copy()
-    sub["active"] = sub["last_seen"].apply(lambda s: (now_ts - iso_to_ts(str(s))) <= 10.0)
-    total = len(sub["player"].unique())
-    sync_ok = len(sub[(sub["phase"] == cur_phase) & (sub["active"])]["player"].unique())
+    sync_ok = len(PRESENCE.active(state["round_id"], phase=cur_phase))
     st.caption(f"🔎 Sync: {sync_ok}/{total} Spieler in Phase „{cur_phase}“ (aktiv)")
+    progress = GAME.auto.progress(state)
+    if progress is not None:
+        au = GAME.auto.stats
+        last = "–" if au["last_ms"] is None else f"{au['last_ms']:.0f} ms"
+        st.caption(f"✔ Aktuelle Frage: {progress[0]}/{progress[1]} fertig · Auto-Weiter: {au['complete']}× vollständig, "
+                   f"{au['deadline']}× Frist · letzte Einreichung → Wechsel {last} (max {au['max_ms']:.0f} ms)")
+    cs = STORAGE.cache_stats()
+    st.caption(f"🗄 Cache: {cs['hits']} Treffer / {cs['misses']} Parses · Wertung: {scoring.stats['hits']} gemerkt / {scoring.stats['misses']} berechnet")
+    ws = STORAGE.write_stats()
+    if ws:
+        st.caption(f"📨 Schreib-Queue: {ws['depth']} offen (max {ws['max_depth']}) · Flush {ws['last_ms']:.1f} ms (max {ws['max_ms']:.1f}) · {ws['rows']} Einreichungen in {ws['batches']} Batches")
+    mc = GAME.media.cache_info()
+    if mc["entries"] or mc["stored"]:
+        st.caption(f"🖼 Medien: {mc['entries']} im Cache ({mc['bytes'] / 1e6:.1f} MB) · {mc['hits']} Treffer / {mc['misses']} gelesen · "
+                   f"{mc['stored']} gespeichert, {mc['deduped']} schon vorhanden")
+    rec = GAME.events.stats["recovery"]
+    if rec is not None:
+        st.caption(f"🧾 Event-Log: {GAME.events.pending()} Events seit Snapshot · Wiederanlauf beim Start: "
+                   f"{rec['events']} Events in {rec['ms']:.0f} ms, {rec['rows']} Einreichungen nachgetragen")
+    host_profile_panel()
+
+def host_profile_panel():
+    with st.expander("⏱ Performance (letzte Minute)"):
+        rows = profiling.summary(ROOM)
+        if not rows:
+            st.caption(f"Noch keine gesampelten Reruns (Rate {profiling.SAMPLE_RATE:.0%}, QUIZ_PROFILE_SAMPLE).")
+        else:
+            st.dataframe(rows, use_container_width=True, hide_index=True)
 
 # ---------- Views ----------
+@profiled("view_lobby")
 def view_lobby():
+    update_presence("lobby")
     state = load_state()
     st.subheader("👥 Lobby")
     st.caption(f"Runde: {state['round_id']}")
@@ -325,13 +297,11 @@ def view_lobby():
         host_sync_dashboard()
         st.info("Host steuert den Ablauf. Erst Runde starten, dann mit ▶️ weiter.")
         if st.button("🚀 Runde starten (Schreib-Phase)"):
-            if state["round_id"] == 0:
-                state["round_id"] = 1
-                save_state(state)
-            start_phase("write"); st.rerun()
+            GAME.start_round(); st.rerun()
     else:
         st.write("Warte auf Start der Runde durch den Host.")
 
+@profiled("view_write")
 def view_write():
     update_presence("write")
     state = load_state()
@@ -340,10 +310,7 @@ def view_write():
         st.warning("Bitte links Namen eingeben und **Beitreten** drücken."); return
     name = st.session_state["player_name"]
 
-    qdf = load_df(QUESTIONS_CSV)
-    already = False
-    if not qdf.empty:
-        already = any((qdf['round_id']==state['round_id']) & (qdf['author']==name))
+    already = GAME.has_question(state["round_id"], name)
     if already:
         st.success("✅ Deine Frage ist eingereicht. Warte auf ▶️ vom Host.")
     else:
@@ -353,39 +320,59 @@ def view_write():
             w1 = st.text_input("Falsche Antwort 1")
             w2 = st.text_input("Falsche Antwort 2 (optional)")
             w3 = st.text_input("Falsche Antwort 3 (optional)")
+            up = st.file_uploader("Bild oder Audio (optional)", type=sorted({*media.IMAGE_TYPES, *media.AUDIO_TYPES}))
             ok = st.form_submit_button("Einreichen")
         if ok:
             if not q or not c or not w1:
                 st.error("Bitte Frage, richtige Antwort und mindestens eine falsche Antwort ausfüllen.")
             else:
-                qdf2 = load_df(QUESTIONS_CSV)
-                new_id = int((qdf2["id"].max()+1) if not qdf2.empty else 1)
-                new_row = {"id": new_id, "round_id": state["round_id"], "author": name,
-                           "question": q, "correct": c, "wrong1": w1, "wrong2": w2, "wrong3": w3,
-                           "difficulty": "n/a", "created_at": utc_now_iso()}
-                qdf2 = pd.concat([qdf2, pd.DataFrame([new_row])], ignore_index=True)
-                save_df(qdf2, QUESTIONS_CSV)
-                st.success("Gespeichert."); st.rerun()
+                similar = GAME.similar_questions(q)
+                if similar and st.session_state.get("dupe_ack") != q:
+                    # Erst warnen; erneutes Einreichen derselben Frage bestätigt
+                    st.session_state["dupe_ack"] = q
+                    sim, prev = similar[0]
+                    st.warning(f"⚠️ Eine sehr ähnliche Frage gab es schon (Runde {prev['round_id']}, {sim:.0%} gleich): "
+                               f"„{prev['question']}“. Nochmal **Einreichen**, um sie trotzdem zu verwenden.")
+                else:
+                    try:
+                        GAME.submit_question(state["round_id"], name, q, c, w1, w2, w3,
+                                             media=(up.name, up.getvalue()) if up is not None else None)
+                    except ValueError as e:
+                        st.error(str(e))
+                    else:
+                        st.success("Gespeichert."); st.rerun()
     if st.session_state["is_host"]:
-        host_controls(); host_sync_dashboard()
+        for cur, prev in GAME.dupes.flagged(state["round_id"]):
+            if prev is not None:
+                st.caption(f"🚩 {cur['author']}: „{cur['question']}“ ähnelt „{prev['question']}“ "
+                           f"(Runde {prev['round_id']}, {prev['author']})")
+        host_controls(); host_pack_import(); host_sync_dashboard()
+
+def show_media(card):
+    # Vorschaubild/Audio aus dem LRU-Cache des Prozesses (media.py), ohne Platte und ohne Skalieren
+    ref = card.get("media")
+    data = GAME.media.display(ref) if ref else None
+    if data is None:
+        return
+    if media.kind(ref) == "image":
+        st.image(data, width=media.DISPLAY_PX)
+    else:
+        st.audio(data, format=media.AUDIO_TYPES[ref.rsplit(".", 1)[1]])
 
+@profiled("view_answer")
 def view_answer():
     update_presence("answer")
     state = load_state()
     st.subheader("🎮 Phase 2: Beantworten")
-    qdf = load_df(QUESTIONS_CSV)
     if len(state["question_order"]) == 0:
         st.warning("Keine Fragen vorhanden. Host: drücke 🔁 oder starte neu.")
         if st.session_state["is_host"]: host_controls(); host_sync_dashboard()
         return
-    qid = state["question_order"][state["current_q_idx"]]
-    q = qdf[qdf["id"] == qid].iloc[0]
+    q = GAME.current_card(state)
+    qid = q["qid"]
     st.markdown(f"**Frage {state['current_q_idx']+1}/{len(state['question_order'])}:** {q['question']}")
-
-    opts = [q["correct"], q["wrong1"]]
-    if isinstance(q["wrong2"], str) and str(q["wrong2"]).strip(): opts.append(q["wrong2"])
-    if isinstance(q["wrong3"], str) and str(q["wrong3"]).strip(): opts.append(q["wrong3"])
-    random.seed(qid); random.shuffle(opts)
+    show_media(q)
+    opts = q["options"]
 
     if st.session_state.get("logged_in") is not True:
         st.warning("Bitte links Namen eingeben und **Beitreten** drücken."); return
@@ -394,10 +381,7 @@ def view_answer():
         st.info("🙅‍♂️ Eigene Frage — nicht beantwortbar.")
         st.radio("Antwortoptionen (deaktiviert):", opts, index=None, disabled=True)
     else:
-        adf = load_df(ANSWERS_CSV)
-        answered = False
-        if not adf.empty:
-            answered = any((adf['round_id']==state['round_id']) & (adf['player']==name) & (adf['question_id']==qid))
+        answered = GAME.has_answered(state["round_id"], name, qid)
         if answered:
             st.info("✅ Antwort gespeichert.")
         else:
@@ -408,16 +392,12 @@ def view_answer():
                 if choice is None:
                     st.error("Bitte eine Antwort wählen.")
                 else:
-                    is_correct = (choice == q["correct"])
-                    adf = load_df(ANSWERS_CSV)
-                    new_row = {"timestamp": utc_now_iso(), "round_id": state["round_id"], "player": name,
-                               "question_id": int(qid), "answer": choice, "is_correct": bool(is_correct)}
-                    adf = pd.concat([adf, pd.DataFrame([new_row])], ignore_index=True)
-                    save_df(adf, ANSWERS_CSV)
+                    GAME.submit_answer(state["round_id"], name, q, choice)
                     st.success("Antwort gespeichert."); st.rerun()
     if st.session_state["is_host"]:
         host_controls(); host_sync_dashboard()
 
+@profiled("view_reveal")
 def view_reveal():
     update_presence("reveal")
     state = load_state()
@@ -426,14 +406,13 @@ def view_reveal():
         st.warning("Keine Fragen vorhanden."); 
         if st.session_state["is_host"]: host_controls(); host_sync_dashboard()
         return
-    qdf = load_df(QUESTIONS_CSV)
-    qid = state["question_order"][state["current_q_idx"]]
-    q = qdf[qdf["id"] == qid].iloc[0]
-    st.markdown(f"**Richtige Antwort:** ✅ **{q['correct']}**")
+    q = GAME.current_card(state)
+    st.markdown(f"**Richtige Antwort:** ✅ **{q['options'][q['correct_idx']]}**")
     st.caption(f"Autor: {q['author']}")
     if st.session_state["is_host"]:
         host_controls(); host_sync_dashboard()
 
+@profiled("view_rate")
 def view_rate():
     update_presence("rate")
     state = load_state()
@@ -442,9 +421,8 @@ def view_rate():
         st.warning("Keine Fragen."); 
         if st.session_state["is_host"]: host_controls(); host_sync_dashboard()
         return
-    qdf = load_df(QUESTIONS_CSV)
-    qid = state["question_order"][state["current_q_idx"]]
-    q = qdf[qdf["id"] == qid].iloc[0]
+    q = GAME.current_card(state)
+    qid = q["qid"]
     st.markdown(f"**Frage {state['current_q_idx']+1}/{len(state['question_order'])}:** {q['question']}")
 
     if st.session_state.get("logged_in") is not True:
@@ -456,9 +434,7 @@ def view_rate():
         st.info("🙅‍♂️ Eigene Frage — Bewertung deaktiviert.")
         st.slider("Sterne (deaktiviert)", 1, 5, 4, disabled=True)
     else:
-        rdf = load_df(RATINGS_CSV); rated = False
-        if not rdf.empty:
-            rated = any((rdf['round_id']==state['round_id']) & (rdf['player']==name) & (rdf['question_id']==qid))
+        rated = GAME.has_rated(state["round_id"], name, qid)
         if rated:
             st.info("✅ Bewertung gespeichert.")
         else:
@@ -466,70 +442,53 @@ def view_rate():
                 stars = st.slider("Sterne", 1, 5, 4)
                 ok = st.form_submit_button("Bewerten")
             if ok:
-                rdf = load_df(RATINGS_CSV)
-                new_row = {"timestamp": utc_now_iso(), "round_id": state["round_id"], "player": name, "question_id": int(qid), "stars": int(stars)}
-                rdf = pd.concat([rdf, pd.DataFrame([new_row])], ignore_index=True)
-                save_df(rdf, RATINGS_CSV)
+                GAME.submit_rating(state["round_id"], name, qid, stars)
                 st.success("Bewertung gespeichert."); st.rerun()
     if st.session_state["is_host"]:
         host_controls(); host_sync_dashboard()
 
-def compute_scores(round_id):
-    qdf = load_df(QUESTIONS_CSV); adf = load_df(ANSWERS_CSV); rdf = load_df(RATINGS_CSV)
-    qdf = qdf[qdf["round_id"]==round_id].copy()
-    adf = adf[adf["round_id"]==round_id].copy()
-    rdf = rdf[rdf["round_id"]==round_id].copy()
-
-    if not adf.empty:
-        ppts = adf.groupby("player")["is_correct"].sum().mul(10).rename("Spielerpunkte")
-    else:
-        ppts = pd.Series(dtype=float, name="Spielerpunkte")
-
-    rows = []
-    for _, q in qdf.iterrows():
-        qid = int(q["id"])
-        sub = adf[adf["question_id"] == qid]
-        N = len(sub); C = int(sub["is_correct"].sum()) if N>0 else 0
-        base = 0
-        if N>0:
-            base = 5 * max(N - C, 0)
-            if C==0: base = 2
-            elif C==N: base = 0
-        rsub = rdf[rdf["question_id"]==qid]
-        stars_avg = rsub["stars"].mean() if len(rsub)>0 else 3.0
-        mult = 0.2*stars_avg + 0.4
-        rows.append({"author": q["author"], "author_points": base*mult})
-    ap = pd.DataFrame(rows)
-    if not ap.empty:
-        apts = ap.groupby("author")["author_points"].sum().rename("Autorenpunkte")
-    else:
-        apts = pd.Series(dtype=float, name="Autorenpunkte")
-
-    total = pd.concat([ppts, apts], axis=1)
-    if "Spielerpunkte" not in total.columns: total["Spielerpunkte"] = 0.0
-    if "Autorenpunkte" not in total.columns: total["Autorenpunkte"] = 0.0
-    total = total.fillna(0.0)
-    total["Gesamt"] = total["Spielerpunkte"].astype(float) + total["Autorenpunkte"].astype(float)
-
-    if total.empty:
-        return pd.DataFrame(columns=["Name", "Spielerpunkte", "Autorenpunkte", "Gesamt"])
-    total = total.sort_values("Gesamt", ascending=False).reset_index().rename(columns={"index":"Name"})
-    return total
-
+@profiled("view_results")
 def view_results():
     update_presence("results")
     state = load_state()
     st.subheader("🏆 Ergebnisse")
-    df = compute_scores(state["round_id"])
+    df = GAME.compute_scores(state["round_id"])
     if df is None or df.empty:
         st.info("Noch keine Daten in dieser Runde.")
     else:
         st.dataframe(df.style.format({"Spielerpunkte":"{:.0f}","Autorenpunkte":"{:.1f}","Gesamt":"{:.1f}"}), use_container_width=True)
+    season_board()
     if st.session_state["is_host"]:
         host_controls(); host_sync_dashboard()
 
+def season_board():
+    # Saisonwertung aus den gespeicherten Runden-Zusammenfassungen, siehe season.py
+    with st.expander("🏅 Saison / Ewige Tabelle"):
+        c1, c2 = st.columns(2)
+        with c1:
+            since = st.text_input("Von (JJJJ-MM-TT)", key="season_since").strip()
+        with c2:
+            until = st.text_input("Bis (JJJJ-MM-TT)", key="season_until").strip()
+        board = GAME.standings(since or None, until or None)
+        if board.empty:
+            st.caption("Noch keine abgeschlossenen Runden.")
+        else:
+            st.dataframe(board.style.format({"Spielerpunkte": "{:.0f}", "Autorenpunkte": "{:.1f}", "Gesamt": "{:.1f}",
+                                             "Trefferquote": "{:.0%}", "Ø Sterne": "{:.2f}"}, na_rep="–"),
+                         use_container_width=True, hide_index=True)
+
 # ---------- Router & instant sync trigger ----------
 state = load_state()
+profiling.annotate(phase=state["phase"], round_id=int(state["round_id"]))
+sync_names = ["state"]
+watch_presence = state["phase"] == "lobby" or st.session_state["is_host"]  # Lobby-Liste / Sync-Dashboard
+if watch_presence:
+    sync_names.append("presence")
+if st.session_state["is_host"] and state["phase"] in PHASE_TABLES:
+    # Host: Fortschritt „x/y fertig“ aktualisiert sich mit jeder Antwort/Bewertung der Runde
+    sync_names.append(partition_name(PHASE_TABLES[state["phase"]], state["round_id"]))
+sync_token = STORAGE.change_token(sync_names)
+presence_token = PRESENCE.token(state["round_id"]) if watch_presence else None
 
 # Instant phase-change detection via last_update / sync_nonce
 if st.session_state["last_update_seen"] and st.session_state["last_update_seen"] != state.get("last_update"):
@@ -551,22 +510,10 @@ phase_names = {
     "rate": "Bewerten",
     "results": "Ergebnisse"
 }
-st.markdown(f"**Aktuelle Phase:** {phase_names.get(phase, phase)}")
+st.markdown(f"**Raum:** {ROOM} · **Aktuelle Phase:** {phase_names.get(phase, phase)}")
 
 if phase == "lobby":
-    update_presence("lobby")
-    st.subheader("👥 Lobby")
-    st.caption(f"Runde: {state['round_id']}")
-    lobby_list()
-    if st.session_state["is_host"]:
-        host_sync_dashboard()
-        st.info("Host steuert den Ablauf. Erst Runde starten, dann mit ▶️ weiter.")
-        if st.button("🚀 Runde starten (Schreib-Phase)"):
-            if state["round_id"] == 0:
-                state["round_id"] = 1; save_state(state)
-            start_phase("write"); st.rerun()
-    else:
-        st.write("Warte auf Start der Runde durch den Host.")
+    view_lobby()
 elif phase == "write":
     view_write()
 elif phase == "answer":
@@ -579,11 +526,25 @@ elif phase == "results":
     view_results()
 else:
     st.error("Unbekannte Phase. Zurück zur Lobby.")
-    reset_round(new_round=False)
-
-# ---------- Stronger sync: global 0.25s tick ----------
-st.caption("🔄 Sync aktiv (0.25s) — Host steuert den Ablauf")
-time.sleep(SYNC_TICK_SEC)
-st.rerun()
+    GAME.reset_round(new_round=False)
+
+# ---------- Event-driven sync ----------
+# Rerun nur, wenn sich State oder eine für diese Ansicht relevante Tabelle ändert.
+@st.fragment(run_every=SYNC_TICK_SEC)
+def sync_watcher(token, names, phase, round_id, p_token):
+    update_presence(phase)  # Heartbeat ohne kompletten Rerun
+    if st.session_state.get("sync_watch_armed") is not True:
+        # erster Lauf gehört zum normalen Skriptlauf -> nicht blockieren
+        st.session_state["sync_watch_armed"] = True
+        return
+    if STORAGE.wait_for_change(token, names, SYNC_WAIT_SEC):
+        st.rerun()
+    if p_token is not None and PRESENCE.token(round_id) != p_token:
+        st.rerun()  # jemand ist inaktiv geworden (grauer Punkt)
+
+st.session_state["sync_watch_armed"] = False
+sync_watcher(sync_token, sync_names, phase, state["round_id"], presence_token)
+profiling.end_rerun(phase=phase, round_id=int(state["round_id"]), player=st.session_state["player_name"])
+st.caption("🔄 Sync aktiv — Aktualisierung bei Änderungen, Host steuert den Ablauf")
 
 st.markdown("<div class='footerq'>Made by Quirlin</div>", unsafe_allow_html=True)
@@ -0,0 +1,117 @@
+# Auto-Weiter für Antwort- und Bewertungs-Phase: sobald alle aktiven Spieler außer dem Autor
+# die aktuelle Frage beantwortet (bzw. bewertet) haben oder die Frist abläuft, ruft die Engine
+# selbst advance(). Fortschritt = Zähler pro Frage, bei jeder Einreichung fortgeschrieben;
+# answers/ratings werden dafür nie neu gelesen (nur einmal pro Prozess zum Anlaufen).
+# Einreichungen anderer Prozesse sieht der Zähler nicht – dort greift die Frist.
+import threading, time
+from presence import iso_to_ts
+
+PHASE_TABLES = {"answer": "answers", "rate": "ratings"}
+DEFAULT_DEADLINE_SEC = 60   # 0 = keine Frist
+POLL_SEC = 0.5              # Takt des Frist-Threads
+
+
+class AutoAdvance:
+    def __init__(self, game):
+        self.game = game
+        self._done = {}             # (Tabelle, round_id, qid) -> Spieler mit Einreichung
+        self._last_submit = {}      # (Tabelle, round_id, qid) -> Zeitpunkt der letzten Einreichung
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.stats = {"advances": 0, "complete": 0, "deadline": 0, "last_ms": None, "max_ms": 0.0}
+
+    def _seed(self, table, round_id, qid):
+        # Einmal pro Prozess und Frage: Stand von der Platte (z. B. nach Neustart)
+        key = (table, int(round_id), int(qid))
+        if key in self._done:
+            return self._done[key]
+        df = self.game.load_df(table, round_id)
+        players = set() if df.empty else set(df.loc[df["question_id"] == int(qid), "player"].astype(str))
+        with self._lock:
+            return self._done.setdefault(key, players)
+
+    def note(self, table, round_id, qid, player):
+        # Von Game.submit_answer / submit_rating nach dem Einreihen aufgerufen
+        done = self._seed(table, round_id, qid)
+        with self._lock:
+            done.add(str(player))
+            self._last_submit[(table, int(round_id), int(qid))] = time.monotonic()
+        self.check()
+
+    def progress(self, state, card=None):
+        # (eingereicht, erwartet) für die aktuelle Frage, None außerhalb answer/rate
+        table = PHASE_TABLES.get(state["phase"])
+        if table is None or not state["question_order"]:
+            return None
+        card = card or self.game.current_card(state)
+        expected = set(self.game.presence.active(state["round_id"])) - {str(card["author"])}
+        done = self._seed(table, state["round_id"], card["qid"])
+        with self._lock:
+            return len(expected & done), len(expected)
+
+    def check(self, now=None):
+        # Gibt die neue Phase zurück, wenn weitergeschaltet wurde
+        state = self.game.load_state()
+        cfg = state.get("auto_advance") or {}
+        if not cfg.get("enabled"):
+            return None
+        self._ensure_thread()
+        table = PHASE_TABLES.get(state["phase"])
+        if table is None or not state["question_order"]:
+            return None
+        card = self.game.current_card(state)
+        done, expected = self.progress(state, card)
+        deadline = int(cfg.get("deadline_sec") or 0)
+        wall = time.time() if now is None else now
+        if expected > 0 and done >= expected:
+            reason = "complete"
+        elif deadline and wall - iso_to_ts(state["phase_started_at"]) >= deadline:
+            reason = "deadline"
+        else:
+            return None
+        from engine import FlushError
+        storage = self.game.storage
+        if not storage.flush_writes():
+            return None  # Schreibfehler: nicht weiterschalten, nächster Versuch im Frist-Takt
+        with storage.locked("state"):
+            cur = self.game.load_state()
+            # ein anderer Auslöser (Session, Prozess, Host) war schneller
+            if (cur["phase"], cur["current_q_idx"], cur["phase_started_at"]) != \
+                    (state["phase"], state["current_q_idx"], state["phase_started_at"]):
+                return None
+            try:
+                nxt = self.game.advance()
+            except FlushError:
+                return None
+        last = self._last_submit.get((table, int(state["round_id"]), int(card["qid"])))
+        with self._lock:
+            self.stats["advances"] += 1
+            self.stats[reason] += 1
+            if last is not None:
+                ms = (time.monotonic() - last) * 1000  # letzte Einreichung -> Phasenwechsel
+                self.stats["last_ms"] = round(ms, 2)
+                self.stats["max_ms"] = round(max(self.stats["max_ms"], ms), 2)
+        return nxt
+
+    def _ensure_thread(self):
+        # Frist-Thread erst, wenn Auto-Weiter einmal eingeschaltet war
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True,
+                                                name=f"quiz-autoadvance:{self.game.storage.data_dir}")
+                self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _loop(self):
+        while not self._stop.wait(POLL_SEC):
+            try:
+                self.check()
+            except Exception:
+                pass
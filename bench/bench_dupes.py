@@ -0,0 +1,65 @@
+# Benchmark des Ähnlichkeits-Index (dupes.py): Aufbau über N synthetische Fragen, Neuladen
+# aus dupes.jsonl und Abfrage-Latenz für leicht veränderte bzw. neue Fragen.
+#
+#   python bench/bench_dupes.py --questions 20000 --queries 500
+import argparse, json, os, random, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dupes
+from storage import CsvStorage
+
+WORDS = ("wie welche wer wann wo heißt ist war hat die der das von im auf hauptstadt fluss berg "
+         "land jahr erfand schrieb gewann spielte liegt größte kleinste älteste erste letzte stadt "
+         "insel meer film buch lied band farbe tier pflanze planet stern sprache währung").split()
+
+
+def question(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 10))).capitalize() + f" {rng.randint(1, 10**6)}?"
+
+def edit(rng, q):
+    # leichte Änderung: ein Wort tauschen
+    words = q.split()
+    words[rng.randrange(len(words) - 1)] = rng.choice(WORDS)
+    return " ".join(words)
+
+def percentile(values, p):
+    s = sorted(values)
+    return s[min(len(s) - 1, int(len(s) * p / 100))]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--questions", type=int, default=20000)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--rounds", type=int, default=100)
+    args = ap.parse_args()
+    rng = random.Random(1)
+    rows = [{"id": i + 1, "round_id": 1 + i * args.rounds // args.questions, "author": f"P{i % 40}",
+             "question": question(rng)} for i in range(args.questions)]
+    with tempfile.TemporaryDirectory() as data_dir:
+        storage = CsvStorage(data_dir)
+        storage.ensure({})
+        idx = dupes.DupeIndex(storage)
+        t0 = time.perf_counter()
+        idx.add_many(rows)
+        build_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        reloaded = dupes.DupeIndex(storage)
+        reload_ms = (time.perf_counter() - t0) * 1000
+        out = {"questions": args.questions, "build_ms": round(build_ms, 1),
+               "build_us_per_question": round(1000 * build_ms / args.questions, 1),
+               "reload_ms": round(reload_ms, 1), "index_bytes": os.path.getsize(idx.path)}
+        for kind in ("near", "new"):
+            times, hits = [], 0
+            for _ in range(args.queries):
+                q = edit(rng, rng.choice(rows)["question"]) if kind == "near" else question(rng)
+                t0 = time.perf_counter()
+                hits += bool(reloaded.query(q))
+                times.append((time.perf_counter() - t0) * 1000)
+            out[f"query_{kind}"] = {"p50_ms": round(percentile(times, 50), 3), "p95_ms": round(percentile(times, 95), 3),
+                                    "hit_rate": round(hits / args.queries, 3)}
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
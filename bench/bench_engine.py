@@ -0,0 +1,74 @@
+# Mikrobenchmark der Spiel-Engine ohne Streamlit: Import, eine komplette Runde über
+# engine.Game (Einreichungen + advance) und compute_scores (kalt/gemerkt).
+#
+#   python bench/bench_engine.py --players 20 --questions 5 [--backend sqlite]
+import argparse, json, os, subprocess, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def import_ms(module):
+    # Im frischen Interpreter, sonst misst man nur den Modul-Cache
+    code = f"import time; t = time.perf_counter(); import {module}; print((time.perf_counter() - t) * 1000)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return round(float(out.stdout.strip()), 2)
+
+
+def timed(samples, name, fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    samples.setdefault(name, []).append((time.perf_counter() - t0) * 1000)
+    return result
+
+
+def play_round(game, players, n_questions):
+    samples = {}
+    timed(samples, "start_round", game.start_round)
+    rid = game.load_state()["round_id"]
+    for i in range(n_questions):
+        timed(samples, "submit_question", game.submit_question, rid, players[i], f"Frage {i}?", f"R{i}", f"F{i}")
+    timed(samples, "advance", game.advance)
+    for qi in range(n_questions):
+        state = game.load_state()
+        card = timed(samples, "current_card", game.current_card, state)
+        for i, p in enumerate(players):
+            if p != card["author"]:
+                timed(samples, "submit_answer", game.submit_answer, rid, p, card,
+                      card["options"][(i + qi) % len(card["options"])])
+        timed(samples, "advance", game.advance)   # -> reveal
+        timed(samples, "advance", game.advance)   # -> rate
+        for i, p in enumerate(players):
+            if p != card["author"]:
+                timed(samples, "submit_rating", game.submit_rating, rid, p, card["qid"], 1 + (i + qi) % 5)
+        timed(samples, "advance", game.advance)   # -> answer / results
+    timed(samples, "compute_scores (kalt)", game.compute_scores, rid)
+    for _ in range(20):
+        timed(samples, "compute_scores (gemerkt)", game.compute_scores, rid)
+    return samples
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--players", type=int, default=20)
+    ap.add_argument("--questions", type=int, default=5)
+    ap.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    args = ap.parse_args()
+
+    report = {"import_ms": {m: import_ms(m) for m in ("engine", "storage")}}
+    import engine
+    with tempfile.TemporaryDirectory() as data_dir:
+        game = engine.open_game(data_dir, args.backend)
+        try:
+            players = [f"P{i:03d}" for i in range(args.players)]
+            samples = play_round(game, players, min(args.questions, args.players))
+            report["final_phase"] = game.load_state()["phase"]
+        finally:
+            game.close()  # Hintergrund-Threads (Archiv, Queue, Präsenz, …) vor dem Aufräumen beenden
+    report["calls"] = {name: {"n": len(v), "mean_ms": round(sum(v) / len(v), 3), "max_ms": round(max(v), 3)}
+                       for name, v in samples.items()}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# Benchmark des Wiederanlaufs (eventlog.py): N Einreichungen hinter dem letzten Snapshot,
+# davon ein Teil nie auf die Platte gekommen (Absturz mit voller Write-Behind-Queue); gemessen
+# wird EventLog.recover() in einem frischen Storage – einmal ohne Snapshot (ganzes Log),
+# einmal mit Snapshot alle SNAPSHOT_EVERY Events.
+#
+#   python bench/bench_recovery.py --events 20000 --lost 200
+import argparse, json, os, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import eventlog
+from engine import initial_state
+from storage import CsvStorage
+
+
+def run(events, lost, snapshot_every):
+    with tempfile.TemporaryDirectory() as data_dir:
+        storage = CsvStorage(data_dir)
+        storage.bootstrap(initial_state())
+        log = eventlog.EventLog(storage)
+        log.recover()
+        eventlog.SNAPSHOT_EVERY = snapshot_every or 10**9
+        players = [f"P{i}" for i in range(50)]
+        batch = []
+        for i in range(events):
+            row = {"timestamp": "2024-01-01T20:00:00", "round_id": 1 + i // 5000, "player": players[i % 50],
+                   "question_id": i // 50, "answer": "a", "is_correct": bool(i % 3)}
+            log.rows("answers", [row])
+            if i < events - lost:
+                batch.append(row)
+            if len(batch) >= 500:
+                storage.append_rows(batch, "answers"); batch = []
+        if batch:
+            storage.append_rows(batch, "answers")
+        while log._snapshotting:
+            time.sleep(0.01)
+        size = os.path.getsize(log.path)
+        os.close(log._live_fd)         # Prozess ist "abgestürzt": gibt seine Raum-Sperre frei
+        fresh = CsvStorage(data_dir)   # "Neustart": kalter Cache, neuer Log-Zustand
+        t0 = time.perf_counter()
+        rec = eventlog.EventLog(fresh).recover()
+        ms = (time.perf_counter() - t0) * 1000
+        return {"events": events, "snapshot_every": snapshot_every, "log_kb": round(size / 1024),
+                "replayed": rec["events"], "restored_rows": rec["rows"], "recover_ms": round(ms, 1)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=20000)
+    ap.add_argument("--lost", type=int, default=200)
+    args = ap.parse_args()
+    out = [run(args.events, args.lost, every) for every in (0, eventlog.SNAPSHOT_EVERY)]
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
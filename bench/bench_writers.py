@@ -0,0 +1,127 @@
+# Mehrprozess-Benchmark für gleichzeitige Einreichungen.
+# Vergleicht das alte Muster (load -> concat -> save ohne Sperre, state.json in-place)
+# mit dem aktuellen Storage (Append unter flock, Temp-Datei + os.replace).
+#
+#   python bench/bench_writers.py --workers 8 --per-worker 50
+import argparse, json, os, sys, tempfile, time
+import multiprocessing as mp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pandas as pd
+from storage import CsvStorage, SqliteStorage
+
+INIT_STATE = {"round_id": 1, "phase": "answer", "sync_nonce": 0}
+ANSWER_COLUMNS = ["timestamp", "round_id", "player", "question_id", "answer", "is_correct"]
+MAX_RETRIES = 1000          # altes Muster: so oft wird eine kaputte Datei neu gelesen
+
+
+def _answer_row(worker, i):
+    return {"timestamp": f"{time.time():.6f}", "round_id": 1, "player": f"w{worker}",
+            "question_id": i, "answer": "x", "is_correct": True}
+
+def _retry_read(read):
+    # (Ergebnis, Fehlversuche); nach MAX_RETRIES None, statt endlos zu warten
+    for attempt in range(MAX_RETRIES):
+        try:
+            return read(), attempt
+        except Exception:  # halb geschriebene Datei erwischt
+            pass
+    return None, MAX_RETRIES
+
+def _legacy_answers(data_dir, worker, n):
+    path, errors = os.path.join(data_dir, "answers.csv"), 0
+    for i in range(n):
+        df, failed = _retry_read(lambda: pd.read_csv(path))
+        errors += failed
+        if df is None:
+            continue  # Einreichung verloren
+        df = pd.concat([df, pd.DataFrame([_answer_row(worker, i)])], ignore_index=True)
+        df.to_csv(path, index=False)
+    return errors
+
+def _read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _legacy_state(data_dir, worker, n):
+    path, errors = os.path.join(data_dir, "state.json"), 0
+    for _ in range(n):
+        state, failed = _retry_read(lambda: _read_json(path))
+        errors += failed
+        if state is None:
+            continue
+        state["sync_nonce"] += 1
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+    return errors
+
+def _open(backend, data_dir):
+    return SqliteStorage(data_dir) if backend == "sqlite" else CsvStorage(data_dir)
+
+def _safe_answers(data_dir, worker, n, backend):
+    storage = _open(backend, data_dir)
+    for i in range(n):
+        storage.append_row(_answer_row(worker, i), "answers")
+    return 0
+
+def _safe_state(data_dir, worker, n, backend):
+    storage = _open(backend, data_dir)
+    for _ in range(n):
+        with storage.locked("state"):
+            state = storage.load_state()
+            state["sync_nonce"] += 1
+            storage.save_state(state)
+    return 0
+
+def _worker(args):
+    mode, data_dir, worker, n, backend = args
+    if mode == "legacy-answers": return _legacy_answers(data_dir, worker, n)
+    if mode == "legacy-state": return _legacy_state(data_dir, worker, n)
+    if mode == "answers": return _safe_answers(data_dir, worker, n, backend)
+    if mode == "state": return _safe_state(data_dir, worker, n, backend)
+    raise ValueError(mode)
+
+
+def run(mode, workers, per_worker, backend="csv"):
+    with tempfile.TemporaryDirectory() as data_dir:
+        _open("csv" if mode.startswith("legacy") else backend, data_dir).ensure(dict(INIT_STATE))
+        flat = os.path.join(data_dir, "answers.csv")
+        if mode == "legacy-answers":
+            # altes Muster: eine flache answers.csv (das Storage legt nur noch Runden-Partitionen an)
+            with open(flat, "w", encoding="utf-8") as f:
+                f.write(",".join(ANSWER_COLUMNS) + "\n")
+        t0 = time.perf_counter()
+        with mp.Pool(workers) as pool:
+            errors = sum(pool.map(_worker, [(mode, data_dir, w, per_worker, backend) for w in range(workers)]))
+        elapsed = time.perf_counter() - t0
+        storage = _open("csv" if mode.startswith("legacy") else backend, data_dir)
+        if mode.endswith("state"):
+            stored = int(storage.load_state()["sync_nonce"])
+        else:
+            stored = len(pd.read_csv(flat)) if mode == "legacy-answers" else len(storage.load_df("answers"))
+    expected = workers * per_worker
+    return {"mode": mode, "backend": "csv" if mode.startswith("legacy") else backend,
+            "workers": workers, "per_worker": per_worker, "seconds": round(elapsed, 3),
+            "throughput_per_s": round(expected / elapsed, 1), "expected": expected,
+            "stored": stored, "lost_updates": expected - stored, "read_errors": errors}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--per-worker", type=int, default=50)
+    ap.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    ap.add_argument("--json", action="store_true", help="nur JSON ausgeben")
+    args = ap.parse_args()
+    results = [run(m, args.workers, args.per_worker, args.backend)
+               for m in ("legacy-answers", "answers", "legacy-state", "state")]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':16} {'backend':8} {'sub/s':>9} {'lost':>6} {'read err':>9}")
+    for r in results:
+        print(f"{r['mode']:16} {r['backend']:8} {r['throughput_per_s']:>9} {r['lost_updates']:>6} {r['read_errors']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# Lasttest: Host + N simulierte Spieler spielen eine komplette Runde über Streamlits AppTest
+# (lobby -> write -> answer -> reveal -> rate -> results, gesteuert per "▶️ Weiter").
+# Alle Sessions laufen im selben Prozess und teilen sich Storage/Cache wie auf dem Server.
+#
+#   python bench/loadtest.py --players 20 --questions 5 --out report.json
+#
+# Gemessen pro Rerun: Latenz, Lese-/Schreib-Syscalls und Bytes (/proc/self/io), Parses
+# (Cache-Misses), CPU-Zeit; dazu Peak-RSS. Der Bericht ist JSON (Perzentile pro Phase).
+import argparse, json, os, resource, sys, tempfile, time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+
+
+def read_proc_io():
+    # Linux: Syscalls/Bytes des Prozesses; sonst leer
+    try:
+        with open("/proc/self/io", "r") as f:
+            return {k: int(v) for k, v in (line.split(": ") for line in f.read().splitlines())}
+    except OSError:
+        return {}
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    s = sorted(values)
+    k = (len(s) - 1) * p / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = []
+
+    def run(self, at, role, phase):
+        import storage
+        misses = sum(s.cache_stats()["misses"] for s in storage._storages.values())
+        io0, cpu0, t0 = read_proc_io(), time.process_time(), time.perf_counter()
+        at.run()
+        wall = time.perf_counter() - t0
+        cpu, io1 = time.process_time() - cpu0, read_proc_io()
+        misses = sum(s.cache_stats()["misses"] for s in storage._storages.values()) - misses
+        if at.exception:
+            raise RuntimeError(f"{role}: {[e.value for e in at.exception]}")
+        self.samples.append({
+            "role": role, "phase": phase, "wall": wall, "cpu": cpu, "parses": misses,
+            "read_calls": io1.get("syscr", 0) - io0.get("syscr", 0),
+            "write_calls": io1.get("syscw", 0) - io0.get("syscw", 0),
+            "read_bytes": io1.get("rchar", 0) - io0.get("rchar", 0),
+            "write_bytes": io1.get("wchar", 0) - io0.get("wchar", 0),
+        })
+
+    def report(self, tick_sec):
+        by_phase = defaultdict(list)
+        for s in self.samples:
+            by_phase[s["phase"]].append(s)
+        out = {}
+        for phase, rows in list(by_phase.items()) + [("all", self.samples)]:
+            walls = [r["wall"] * 1000 for r in rows]
+            out[phase] = {
+                "reruns": len(rows),
+                "latency_ms": {f"p{p}": round(percentile(walls, p), 2) for p in (50, 95, 99)},
+                "latency_ms_max": round(max(walls), 2),
+                "over_sync_tick": sum(1 for w in walls if w > tick_sec * 1000),
+                "cpu_ms_mean": round(1000 * sum(r["cpu"] for r in rows) / len(rows), 2),
+                "parses_per_rerun": round(sum(r["parses"] for r in rows) / len(rows), 3),
+                **{f"{k}_per_rerun": round(sum(r[k] for r in rows) / len(rows), 1)
+                   for k in ("read_calls", "write_calls", "read_bytes", "write_bytes")},
+            }
+        return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--players", type=int, default=10)
+    ap.add_argument("--questions", type=int, default=3, help="so viele Spieler schreiben eine Frage")
+    ap.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    ap.add_argument("--idle-ticks", type=int, default=1, help="zusätzliche Reruns aller Clients pro Schritt")
+    ap.add_argument("--out", help="Bericht zusätzlich als JSON-Datei schreiben")
+    args = ap.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="quiz-loadtest-")
+    os.environ["QUIZ_DATA_DIR"] = data_dir
+    os.environ["QUIZ_STORAGE"] = args.backend
+    from streamlit.testing.v1 import AppTest
+
+    rec = Recorder()
+    phase = {"name": "lobby"}
+
+    def new_session(role):
+        at = AppTest.from_file(APP, default_timeout=60)
+        rec.run(at, role, phase["name"])
+        return at
+
+    def text(at, label, value, sidebar=False):
+        widgets = at.sidebar.text_input if sidebar else at.text_input
+        next(w for w in widgets if w.label == label).input(value)
+
+    def click(at, label, role):
+        next(b for b in at.button if b.label == label).click()
+        rec.run(at, role, phase["name"])
+
+    def idle(sessions):
+        for _ in range(args.idle_ticks):
+            for role, at in sessions:
+                rec.run(at, role, phase["name"])
+
+    t_start = time.perf_counter()
+    host = new_session("host")
+    text(host, "Host-Name (erstellen)", "Host", sidebar=True)
+    text(host, "Neue Host-PIN", "0000", sidebar=True)
+    click(host, "Host erstellen", "host")
+    text(host, "Dein Name", "Host", sidebar=True)
+    click(host, "Beitreten", "host")
+
+    players = []
+    for i in range(args.players):
+        at = new_session("player")
+        text(at, "Dein Name", f"P{i:03d}", sidebar=True)
+        click(at, "Beitreten", "player")
+        players.append(at)
+    everyone = [("host", host)] + [("player", p) for p in players]
+    idle(everyone)
+
+    click(host, "🚀 Runde starten (Schreib-Phase)", "host")
+    phase["name"] = "write"
+    idle(everyone)
+    for i, at in enumerate(players[: args.questions]):
+        at.text_area[0].input(f"Frage {i}?")
+        text(at, "Richtige Antwort", f"R{i}")
+        text(at, "Falsche Antwort 1", f"F{i}")
+        click(at, "Einreichen", "player")
+
+    click(host, "▶️ Weiter", "host")
+    phase["name"] = "answer"
+    n_questions = min(args.questions, args.players)
+    for qi in range(n_questions):
+        idle(everyone)
+        for i, at in enumerate(players):
+            if at.radio and not at.radio[0].disabled:
+                at.radio[0].set_value(at.radio[0].options[(i + qi) % len(at.radio[0].options)])
+                click(at, "Senden", "player")
+        click(host, "▶️ Weiter", "host")
+        phase["name"] = "reveal"
+        idle(everyone)
+        click(host, "▶️ Weiter", "host")
+        phase["name"] = "rate"
+        idle(everyone)
+        for i, at in enumerate(players):
+            if at.slider and not at.slider[0].disabled:
+                at.slider[0].set_value(1 + (i + qi) % 5)
+                click(at, "Bewerten", "player")
+        click(host, "▶️ Weiter", "host")
+        phase["name"] = "answer" if qi + 1 < n_questions else "results"
+    idle(everyone)
+
+    wall_total = time.perf_counter() - t_start
+
+    sync_tick = 0.25
+    report = {
+        "players": args.players, "questions": n_questions, "backend": args.backend,
+        "idle_ticks": args.idle_ticks, "wall_seconds": round(wall_total, 2),
+        "cpu_seconds": round(time.process_time(), 2),
+        # ru_maxrss: Linux in KiB, macOS in Bytes
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss /
+                             (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+        "sync_tick_ms": sync_tick * 1000,
+        "phases": rec.report(sync_tick),
+    }
+    text_out = json.dumps(report, indent=2)
+    print(text_out)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text_out)
+
+
+if __name__ == "__main__":
+    main()
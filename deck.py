@@ -0,0 +1,38 @@
+# Runden-Deck: beim Start der Antwort-Phase werden Fragen, gemischte Optionen und der
+# Index der richtigen Antwort einmal in Spielreihenfolge festgelegt. Views greifen danach
+# nur noch per Index zu – kein Filtern von questions.csv, kein Neu-Mischen pro Tick.
+import random
+
+
+def options_for(q):
+    # Gleiche Reihenfolge wie früher random.seed(qid); random.shuffle(opts), aber ohne
+    # den globalen Zufallsgenerator anzufassen
+    opts = [q["correct"], q["wrong1"]]
+    if isinstance(q["wrong2"], str) and str(q["wrong2"]).strip(): opts.append(q["wrong2"])
+    if isinstance(q["wrong3"], str) and str(q["wrong3"]).strip(): opts.append(q["wrong3"])
+    random.Random(int(q["id"])).shuffle(opts)
+    return opts
+
+
+def build_deck(qdf, order):
+    by_id = {int(r["id"]): r for r in qdf.to_dict("records")}
+    cards = []
+    for qid in order:
+        q = by_id[int(qid)]
+        opts = options_for(q)
+        cards.append({"qid": int(qid), "question": q["question"], "options": opts,
+                      "correct_idx": opts.index(q["correct"]), "author": q["author"],
+                      "media": q.get("media") if isinstance(q.get("media"), str) and q.get("media") else None})
+    return cards
+
+
+def current_card(storage, state, load_questions):
+    # O(1): Karte an current_q_idx. Fehlt das Deck (Runde lief schon vor dem Update)
+    # oder passt es nicht zur Reihenfolge, wird es einmal nachgebaut.
+    order = state["question_order"]
+    idx = state["current_q_idx"]
+    deck = storage.load_deck(state["round_id"])
+    if len(deck) != len(order) or deck[idx]["qid"] != int(order[idx]):
+        storage.save_deck(state["round_id"], build_deck(load_questions(), order))
+        deck = storage.load_deck(state["round_id"])
+    return deck[idx]
@@ -0,0 +1,179 @@
+# Ähnliche Fragen über alle Runden finden: Zeichen-4-Gramme der normalisierten Frage,
+# MinHash-Signatur (64 Hashes) und LSH (16 Bänder à 4) für die Kandidaten; Kandidaten
+# werden mit der exakten Jaccard-Ähnlichkeit bestätigt. Eine Abfrage kostet damit ein paar
+# Dict-Zugriffe, unabhängig davon, wie viele Fragen es schon gab.
+#
+# Persistiert als Append-Log data/<RAUM>/dupes.jsonl (eine Zeile pro Frage samt Signatur);
+# neue Fragen kommen über Game.submit_question / import_pack hinzu, Zeilen anderer Prozesse
+# werden ab dem zuletzt gelesenen Offset nachgelesen. Beim ersten Öffnen holt der Index nur
+# Runden ab der jüngsten bereits indizierten nach (bzw. einmal die ganze Historie).
+import json, os, re, threading, time, unicodedata, zlib
+import numpy as np
+
+SHINGLE = 4
+NUM_PERM = 64
+BANDS, ROWS = 16, 4         # BANDS * ROWS == NUM_PERM
+THRESHOLD = 0.6             # ab dieser Jaccard-Ähnlichkeit gilt eine Frage als (fast) gleich
+MAX_MATCHES = 3
+_PRIME = 4294967311         # > 2^32; a*h + b passt in uint64
+_rng = np.random.RandomState(20240901)  # fest: Signaturen bleiben über Neustarts gültig
+_A = _rng.randint(1, 2**32 - 1, NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 2**32 - 1, NUM_PERM, dtype=np.uint64)
+
+
+def normalize(text):
+    text = str(text).casefold()
+    if not text.isascii():  # Akzente/Umlaute weg: "heißt" ~ "heisst", "é" ~ "e"
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return re.sub(r"\W+", " ", text).strip()
+
+def shingles(text):
+    t = normalize(text)
+    if len(t) <= SHINGLE:
+        return {t} if t else set()
+    return {t[i:i + SHINGLE] for i in range(len(t) - SHINGLE + 1)}
+
+def signature(sh):
+    if not sh:
+        return [0] * NUM_PERM
+    h = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in sh), dtype=np.uint64, count=len(sh))
+    return ((np.outer(h, _A) + _B) % _PRIME).min(axis=0).tolist()
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+class DupeIndex:
+    def __init__(self, storage):
+        self.storage = storage
+        self.path = os.path.join(storage.data_dir, "dupes.jsonl")
+        self._lock = threading.Lock()
+        self._entries = {}   # id -> {"id", "round_id", "author", "question", "dup_of"}
+        self._bands = [dict() for _ in range(BANDS)]  # Band -> Bucket -> [ids]
+        self._by_round = {}  # round_id -> [ids]
+        self._sigs = {}      # id -> Signatur (Vorfilter vor der exakten Jaccard-Prüfung)
+        self._offset = 0
+        self.stats = {"build_ms": 0.0, "queries": 0, "last_query_ms": 0.0}
+        t0 = time.perf_counter()
+        self._tail()
+        self._catch_up()
+        self.stats["build_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    # ---------- Index im Speicher ----------
+    def _insert(self, rec):
+        qid = int(rec["id"])
+        if qid in self._entries:
+            return
+        self._entries[qid] = {k: rec.get(k) for k in ("id", "round_id", "author", "question", "dup_of")}
+        self._by_round.setdefault(int(rec["round_id"]), []).append(qid)
+        sig = self._sigs[qid] = rec["sig"]
+        for b in range(BANDS):
+            self._bands[b].setdefault(tuple(sig[b * ROWS:(b + 1) * ROWS]), []).append(qid)
+
+    def _tail(self):
+        # Zeilen, die (auch von anderen Prozessen) seit dem letzten Lesen angehängt wurden
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        end = data.rfind(b"\n") + 1   # halbe letzte Zeile erst beim nächsten Mal
+        for line in data[:end].splitlines():
+            try:
+                self._insert(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                pass
+        self._offset += end
+
+    def _catch_up(self):
+        # Fragen, die am Index vorbei gespeichert wurden (ältere Versionen, Migration):
+        # nur Runden ab der jüngsten indizierten, beim allerersten Aufbau alle
+        rounds = self.storage.round_ids()
+        if self._by_round:
+            newest = max(self._by_round)
+            rounds = [r for r in rounds if r >= newest]
+        missing = [r for r in self.storage.iter_rows("questions", rounds)
+                   if int(r["id"]) not in self._entries and isinstance(r.get("question"), str)]
+        if missing:
+            self.add_many(missing)
+
+    # ---------- API ----------
+    def query(self, text, exclude_id=None, limit=MAX_MATCHES):
+        # Ähnlichste frühere Fragen: [(Ähnlichkeit, Eintrag)], absteigend
+        t0 = time.perf_counter()
+        sh = shingles(text)
+        sig = signature(sh)
+        with self._lock:
+            self._tail()
+            found = self._match(sh, sig, exclude_id)
+            self.stats["queries"] += 1
+            self.stats["last_query_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+        return found[:limit]
+
+    def _match(self, sh, sig, exclude_id=None):
+        cands = set()
+        for b in range(BANDS):
+            cands.update(self._bands[b].get(tuple(sig[b * ROWS:(b + 1) * ROWS]), ()))
+        cands.discard(exclude_id)
+        found = []
+        for qid in cands:
+            # Anteil gleicher MinHashes schätzt die Ähnlichkeit; nur knappe Fälle exakt prüfen
+            if sum(a == b for a, b in zip(sig, self._sigs[qid])) < (THRESHOLD - 0.2) * NUM_PERM:
+                continue
+            e = self._entries[qid]
+            sim = jaccard(sh, shingles(e["question"]))
+            if sim >= THRESHOLD:
+                found.append((round(sim, 3), e))
+        found.sort(key=lambda x: -x[0])
+        return found
+
+    def add_many(self, rows):
+        # Neue Fragen (dicts mit id, round_id, author, question) indizieren und anhängen;
+        # dup_of merkt sich die ähnlichste frühere Frage für die Host-Markierung.
+        # Gibt zurück, wie viele der neuen Fragen einer früheren ähneln.
+        lines, flagged = [], 0
+        with self._lock:
+            self._tail()
+            for r in rows:
+                qid = int(r["id"])
+                if qid in self._entries:
+                    continue
+                sh = shingles(r["question"])
+                sig = signature(sh)
+                best = self._match(sh, sig, exclude_id=qid)
+                rec = {"id": qid, "round_id": int(r["round_id"]), "author": str(r["author"]),
+                       "question": str(r["question"]), "dup_of": best[0][1]["id"] if best else None, "sig": sig}
+                self._insert(rec)
+                lines.append(json.dumps(rec, ensure_ascii=False))
+                flagged += bool(best)
+            if lines:
+                with self.storage.locked("dupes"):
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write("\n".join(lines) + "\n")
+                self._tail()  # eigene Zeilen überspringen (Offset nachziehen)
+        return flagged
+
+    def add(self, row):
+        return self.add_many([row])
+
+    def flagged(self, round_id):
+        # Fragen der Runde, die einer früheren ähneln: [(Frage, frühere Frage)]
+        with self._lock:
+            self._tail()
+            entries = (self._entries[qid] for qid in self._by_round.get(int(round_id), ()))
+            return [(e, self._entries.get(int(e["dup_of"]))) for e in entries if e.get("dup_of") is not None]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def index_for(storage):
+    with _indexes_lock:
+        idx = _indexes.get(id(storage))
+        if idx is None:
+            idx = _indexes[id(storage)] = DupeIndex(storage)
+        return idx
@@ -0,0 +1,306 @@
+# Spiel-Engine ohne Streamlit: Phasen-Automat (lobby -> write -> answer -> reveal -> rate ->
+# results), Einreichungen und Wertung, alles über ein Storage. app.py ist nur die Ansicht
+# darüber; Benchmarks, Worker und andere Frontends importieren dieses Modul direkt.
+# Der Import lädt weder Streamlit noch pandas – pandas kommt erst mit dem Storage (open_game).
+import hashlib, random, threading
+from datetime import datetime
+import deck
+from autoadvance import AutoAdvance, DEFAULT_DEADLINE_SEC
+from eventlog import log_for, close_log
+from presence import registry_for, close_registry
+from profiling import profiled
+
+QUESTIONS, ANSWERS, RATINGS, PLAYERS = "questions", "answers", "ratings", "players"
+PHASES = ("lobby", "write", "answer", "reveal", "rate", "results")
+
+
+class FlushError(RuntimeError):
+    # Die Schreib-Queue ließ sich nicht leeren (Schreibfehler, Timeout): die Phase bleibt
+    pass
+
+
+def utc_now_iso():
+    return datetime.utcnow().isoformat()
+
+def initial_state():
+    return {
+        "round_id": 0,
+        "phase": "lobby",  # lobby | write | answer | reveal | rate | results
+        "phase_started_at": None,
+        "question_order": [],
+        "current_q_idx": 0,
+        "host": {"name": None, "pin_hash": None},
+        "last_update": utc_now_iso() + "Z",  # jede Änderung erhöht das
+        "sync_nonce": 0,   # Host kann erhöhen ⇒ Clients erzwingen 1x neu ziehen
+        "auto_advance": {"enabled": False, "deadline_sec": DEFAULT_DEADLINE_SEC},
+    }
+
+def hash_pin(pin):
+    return hashlib.sha256(pin.encode()).hexdigest()
+
+
+class Game:
+    # Ein Spiel (= ein Raum) über seinem Storage. Lesen-Ändern-Schreiben des States läuft
+    # unter storage.locked("state").
+    def __init__(self, storage):
+        self.storage = storage
+        self._ready = False
+        self._ready_lock = threading.Lock()
+        self.auto = AutoAdvance(self)
+
+    @property
+    def presence(self):
+        return registry_for(self.storage)
+
+    @property
+    def dupes(self):
+        # Ähnlichkeits-Index über alle Runden (numpy), erst bei Bedarf aufgebaut
+        from dupes import index_for
+        return index_for(self.storage)
+
+    @property
+    def events(self):
+        # Write-ahead-Log aller Änderungen, siehe eventlog.py
+        return log_for(self.storage)
+
+    @property
+    def media(self):
+        # Bilder/Audio zu Fragen, inhaltsadressiert mit LRU-Cache, siehe media.py
+        from media import media_for
+        return media_for(self.storage)
+
+    def ensure(self):
+        # Bootstrap + Schema-Migrationen + Wiederanlauf aus dem Event-Log einmal pro Prozess;
+        # jeder weitere Rerun nur ein Flag
+        if self._ready:
+            return
+        with self._ready_lock:
+            if not self._ready:
+                self.storage.bootstrap(initial_state())
+                self.events.recover()
+                self._ready = True
+
+    def close(self):
+        # Hintergrund-Threads des Raums beenden und abwarten (Tests, Benchmarks, Prozessende).
+        # Reihenfolge: Auto-Weiter schaltet nicht mehr, der Snapshot des Event-Logs liest noch
+        # Präsenz und Queue, die Präsenz schreibt ihren letzten Stand, zuletzt leert der
+        # Storage die Schreib-Queue und wartet auf Archiv und Kompaktierung.
+        self.auto.close()
+        close_log(self.storage)
+        close_registry(self.storage)
+        self.storage.close()
+        with _games_lock:
+            if _games.get(id(self.storage)) is self:
+                del _games[id(self.storage)]
+
+    # ---------- Storage-Zugriffe (gesampelt profiliert) ----------
+    @profiled("load_df")
+    def load_df(self, table, round_id=None):
+        # mit round_id nur die Partition dieser Runde, sonst die ganze Historie
+        return self.storage.load_df(table, round_id)
+
+    @profiled("append_row")
+    def append_row(self, row, table):
+        # write-behind: landet gebündelt mit anderen Einreichungen auf der Platte; vorher ins
+        # Event-Log, damit ein Absturz mit voller Queue nichts verliert
+        self.events.rows(table, [row])
+        self.storage.submit(row, table)
+
+    @profiled("exists_row")
+    def exists_row(self, table, **where):
+        # "schon eingereicht?" – Mitgliedschafts-Index bzw. SQLite-Index
+        return self.storage.exists_row(table, **where)
+
+    @profiled("load_state")
+    def load_state(self):
+        return self.storage.load_state()
+
+    @profiled("save_state")
+    def save_state(self, state, op="state"):
+        state["last_update"] = utc_now_iso() + "Z"
+        self.events.state(op, state)
+        self.storage.save_state(state)
+
+    # ---------- Host ----------
+    def create_host(self, name, pin):
+        with self.storage.locked("state"):
+            state = self.load_state()
+            state["host"]["name"] = name
+            state["host"]["pin_hash"] = hash_pin(pin)
+            self.save_state(state, "create_host")
+
+    def check_pin(self, pin):
+        pin_hash = self.load_state()["host"]["pin_hash"]
+        return bool(pin_hash) and hash_pin(pin) == pin_hash
+
+    # ---------- Phasen ----------
+    def start_phase(self, phase):
+        with self.storage.locked("state"):  # Lesen-Ändern-Schreiben ohne verlorene Updates
+            state = self.load_state()
+            state["phase"] = phase
+            state["phase_started_at"] = utc_now_iso() + "Z"
+            self.save_state(state, "start_phase")
+
+    def start_round(self):
+        # Aus der Lobby in die Schreib-Phase; die allererste Runde ist Runde 1
+        with self.storage.locked("state"):
+            state = self.load_state()
+            if state["round_id"] == 0:
+                state["round_id"] = 1
+                self.save_state(state, "start_round")
+            self.start_phase("write")
+
+    def reset_round(self, new_round=True):
+        with self.storage.locked("state"):
+            state = self.load_state()
+            if new_round:
+                if state["round_id"] > 0:
+                    # alte Runde ins Archiv, Live-Partition freigeben
+                    self.storage.schedule_archive(state["round_id"], drop_live=True)
+                state["round_id"] += 1
+            state["phase"] = "lobby"
+            state["phase_started_at"] = None
+            state["question_order"] = []
+            state["current_q_idx"] = 0
+            self.save_state(state, "reset_round")
+        self.events.snapshot()
+
+    def prepare_questions_for_round(self):
+        state = self.load_state()
+        qdf = self.load_df(QUESTIONS, state["round_id"])
+        qids = qdf["id"].astype(int).tolist()
+        random.shuffle(qids)
+        # Deck vor dem State schreiben: wer die Antwort-Phase sieht, findet es schon vor
+        self.storage.save_deck(state["round_id"], deck.build_deck(qdf, qids))
+        state["question_order"] = qids
+        state["current_q_idx"] = 0
+        self.save_state(state, "prepare_questions")
+        return qids
+
+    def advance(self):
+        # Nächster Schritt des Automaten; gibt die neue Phase zurück, None wenn es in der
+        # Schreib-Phase noch keine Fragen gibt (dann bleibt alles, wie es ist).
+        if not self.storage.flush_writes():  # alle Einreichungen der Phase auf der Platte, bevor sie wechselt
+            raise FlushError("Einreichungen konnten nicht gespeichert werden – Phase nicht gewechselt")
+        with self.storage.locked("state"):
+            state = self.load_state()
+            phase = state["phase"]
+            if phase == "write":
+                if len(self.prepare_questions_for_round()) == 0:
+                    return None
+                nxt = "answer"
+            elif phase == "answer":
+                nxt = "reveal"
+            elif phase == "reveal":
+                nxt = "rate"
+            elif phase == "rate":
+                if state["current_q_idx"] + 1 < len(state["question_order"]):
+                    state["current_q_idx"] += 1
+                    self.save_state(state, "advance")
+                    nxt = "answer"
+                else:
+                    nxt = "results"
+            else:
+                return phase
+            self.start_phase(nxt)
+        if nxt == "results":
+            self.record_round(state["round_id"])
+            self.storage.schedule_archive(state["round_id"])  # Auswertung liest weiter live
+            self.events.snapshot()
+        return nxt
+
+    def set_auto_advance(self, enabled, deadline_sec=DEFAULT_DEADLINE_SEC):
+        # Auto-Weiter in answer/rate: alle aktiven Nicht-Autoren fertig oder Frist (0 = keine)
+        with self.storage.locked("state"):
+            state = self.load_state()
+            state["auto_advance"] = {"enabled": bool(enabled), "deadline_sec": max(0, int(deadline_sec))}
+            self.save_state(state, "set_auto_advance")
+        self.auto.check()
+
+    def force_sync(self):
+        with self.storage.locked("state"):
+            state = self.load_state()
+            state["sync_nonce"] = int(state.get("sync_nonce", 0)) + 1
+            self.save_state(state, "force_sync")
+
+    # ---------- Einreichungen ----------
+    def has_question(self, round_id, author):
+        return self.exists_row(QUESTIONS, round_id=round_id, author=author)
+
+    def has_answered(self, round_id, player, qid):
+        return self.exists_row(ANSWERS, round_id=round_id, player=player, question_id=qid)
+
+    def has_rated(self, round_id, player, qid):
+        return self.exists_row(RATINGS, round_id=round_id, player=player, question_id=qid)
+
+    def submit_question(self, round_id, author, question, correct, wrong1, wrong2="", wrong3="", media=None):
+        # media: optional (Dateiname, Bytes) eines Bilds/Audios; gespeichert wird nur die Referenz
+        ref = self.media.put(media[1], media[0]) if media else ""
+        new_id = self.storage.next_id(QUESTIONS)  # fortlaufend über alle Runden
+        row = {"id": new_id, "round_id": round_id, "author": author,
+               "question": question, "correct": correct, "wrong1": wrong1, "wrong2": wrong2,
+               "wrong3": wrong3, "difficulty": "n/a", "created_at": utc_now_iso(), "media": ref}
+        self.append_row(row, QUESTIONS)
+        self.dupes.add(row)
+        return new_id
+
+    def similar_questions(self, question):
+        # Frühere (fast) gleiche Fragen aller Runden: [(Ähnlichkeit, Eintrag)]
+        return self.dupes.query(question)
+
+    def submit_answer(self, round_id, player, card, choice):
+        is_correct = card["options"].index(choice) == card["correct_idx"]
+        self.append_row({"timestamp": utc_now_iso(), "round_id": round_id, "player": player,
+                         "question_id": int(card["qid"]), "answer": choice, "is_correct": bool(is_correct)}, ANSWERS)
+        self.auto.note(ANSWERS, round_id, card["qid"], player)
+        return is_correct
+
+    def submit_rating(self, round_id, player, qid, stars):
+        self.append_row({"timestamp": utc_now_iso(), "round_id": round_id, "player": player,
+                         "question_id": int(qid), "stars": int(stars)}, RATINGS)
+        self.auto.note(RATINGS, round_id, qid, player)
+
+    def import_pack(self, stream, author, fmt="csv", round_id=None):
+        # Fragenpaket in die (aktuelle) Runde, siehe packs.py
+        import packs
+        if round_id is None:
+            round_id = self.load_state()["round_id"]
+        return packs.import_pack(self.storage, stream, round_id, author, fmt)
+
+    # ---------- Lesen ----------
+    def current_card(self, state):
+        # eingefrorenes Deck der Runde, siehe deck.py
+        return deck.current_card(self.storage, state, lambda: self.load_df(QUESTIONS, state["round_id"]))
+
+    def record_round(self, round_id):
+        # Zusammenfassung der Runde für die Saisonwertung, siehe season.py
+        import season
+        return season.materialize_round(self.storage, round_id)
+
+    def standings(self, since=None, until=None, players=None):
+        import season
+        return season.standings(self.storage, since, until, players)
+
+    @profiled("compute_scores")
+    def compute_scores(self, round_id):
+        # vektorisiert + gemerkt pro Datenstand, siehe scoring.py
+        import scoring
+        return scoring.compute_scores(self.storage, round_id)
+
+
+_games = {}
+_games_lock = threading.Lock()
+
+def game_for(storage):
+    # Eine Engine pro Storage, geteilt von allen Sessions des Prozesses
+    with _games_lock:
+        game = _games.get(id(storage))
+        if game is None:
+            game = _games[id(storage)] = Game(storage)
+        return game
+
+def open_game(data_dir, backend="csv"):
+    from storage import open_storage
+    game = game_for(open_storage(data_dir, backend))
+    game.ensure()
+    return game
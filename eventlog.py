@@ -0,0 +1,425 @@
+# Write-ahead-Log für Wiederanlauf nach Absturz: jede Änderung (State der Phasen-Methoden,
+# Einreichungen, Pakete, Präsenz-Beitritte/-Phasenwechsel) wird als kompakte Zeile an
+# data/<RAUM>/events.log angehängt, *bevor* sie in state.json/CSV/SQLite landet.
+# Zeilenformat: "<crc32 hex> <json>\n" – eine halb geschriebene oder beschädigte Zeile wird
+# an der Prüfsumme erkannt.
+#
+#   {"k": "s", "op": "advance", "st": {...}}          State nach der Änderung (vollständig, klein)
+#   {"k": "r", "t": "answers", "rows": [{...}]}        Einreichungen bzw. Fragenpaket
+#   {"k": "p", "r": 3, "p": "Anna", "ph": "answer", "ts": 1.7e9}   Präsenz
+#
+# Alle SNAPSHOT_EVERY Events (und bei Ergebnissen/neuer Runde) schreibt ein Prozess einen
+# Snapshot (events.snap.json: State + Segmentnummer), nachdem die Write-Behind-Queue geleert
+# ist, und rotiert das Log: events.log wird zu events-<n>.log, neue Events gehen in ein
+# frisches events.log. Beim Start (engine.Game.ensure) wird nur events.log nachgespielt –
+# die Wiederanlaufzeit hängt also von SNAPSHOT_EVERY ab, nicht von der Länge des Spiels.
+# Einreichungen werden zusätzlich aus dem letzten Segment idempotent geprüft (Queues anderer
+# Prozesse); nachgetragen wird nur, wenn kein anderer Prozess des Raums mehr läuft.
+# Aufbewahrt werden KEEP_SEGMENTS Segmente (QUIZ_EVENTLOG_KEEP, 0 = alle).
+#
+# Mit allen Segmenten lassen sich die Dateien aus dem Log neu erzeugen (ab dessen Einführung):
+#   python eventlog.py rebuild DATA_DIR NEUES_DIR [--backend csv|sqlite]
+import json, os, sys, threading, time, zlib
+from fsutil import write_atomic, log as _log
+
+try:
+    import fcntl
+except ImportError:  # Windows: ein Prozess pro Raum, Wiederanlauf immer vollständig
+    fcntl = None
+
+SNAPSHOT_EVERY = 1000       # Events pro Prozess zwischen zwei Snapshots
+FSYNC_EVERY_SEC = 0.05      # Einreichungen/Präsenz: höchstens so lange nur im Page-Cache
+KEEP_SEGMENTS = int(os.environ.get("QUIZ_EVENTLOG_KEEP", "4"))
+LOG_NAME, SNAP_NAME, LIVE_NAME = "events.log", "events.snap.json", "events.live"
+ROW_TABLES = ("questions", "answers", "ratings")
+
+
+def _plain(v):
+    return v.item() if hasattr(v, "item") else str(v)
+
+def encode(event):
+    body = json.dumps(event, separators=(",", ":"), ensure_ascii=False, default=_plain).encode("utf-8")
+    return b"%08x %s\n" % (zlib.crc32(body), body)
+
+def iter_events(path, offset=0):
+    # (Offset nach der Zeile, Event); hört an einer halben oder kaputten Zeile auf
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n") or len(line) < 10:
+                    return
+                crc, body = line[:8], line[9:-1]
+                try:
+                    ok = int(crc, 16) == zlib.crc32(body)
+                    event = json.loads(body) if ok else None
+                except ValueError:
+                    event = None
+                if event is None:
+                    return
+                offset += len(line)
+                yield offset, event
+    except FileNotFoundError:
+        return
+
+
+def segment_path(data_dir, n):
+    return os.path.join(data_dir, f"events-{int(n):06d}.log")
+
+def segments(data_dir):
+    # Nummern der abgeschlossenen Segmente, aufsteigend
+    out = []
+    for name in os.listdir(data_dir):
+        if name.startswith("events-") and name.endswith(".log"):
+            try:
+                out.append(int(name[7:-4]))
+            except ValueError:
+                pass
+    return sorted(out)
+
+
+class EventLog:
+    def __init__(self, storage):
+        self.storage = storage
+        self.path = os.path.join(storage.data_dir, LOG_NAME)
+        self.snap_path = os.path.join(storage.data_dir, SNAP_NAME)
+        self._lock = threading.Lock()
+        self._fd = None
+        self._live_fd = None
+        self._unsynced = False
+        self._sync_wake = threading.Event()
+        self._sync_thread = None
+        self._snapshot_thread = None
+        self._closed = False
+        self._since_snapshot = 0
+        self._snapshotting = False
+        self._replaying = threading.local()
+        self.stats = {"events": 0, "snapshots": 0, "recovery": None}
+
+    # ---------- Schreiben ----------
+    def _open_log(self):
+        # Unter der events-Sperre: hat ein anderer Prozess rotiert, zeigt unser fd noch auf
+        # das alte Segment -> neu öffnen
+        if self._fd is not None:
+            try:
+                same = os.fstat(self._fd).st_ino == os.stat(self.path).st_ino
+            except FileNotFoundError:
+                same = False
+            if same:
+                return self._fd
+            os.fsync(self._fd)
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def append(self, event, sync=False):
+        if getattr(self._replaying, "on", False):
+            return
+        line = encode(event)
+        with self._lock:
+            with self.storage.locked("events"):   # große Zeilen (Pakete) nicht verschränken
+                fd = self._open_log()
+                os.write(fd, line)
+            if sync:
+                os.fsync(fd)
+                self._unsynced = False
+            else:
+                self._unsynced = True
+            self.stats["events"] += 1
+            self._since_snapshot += 1
+            due = self._since_snapshot >= SNAPSHOT_EVERY and not self._snapshotting
+            if due:
+                self._snapshotting = True
+        if not sync:
+            self._ensure_sync_thread()
+            self._sync_wake.set()
+        if due:  # nicht im Aufrufer: der hält evtl. die State-Sperre
+            self._snapshot_thread = threading.Thread(target=self._snapshot_bg, daemon=True,
+                                                     name=f"quiz-snapshot:{self.storage.data_dir}")
+            self._snapshot_thread.start()
+
+    def _ensure_sync_thread(self):
+        if self._sync_thread is None:
+            with self._lock:
+                if self._sync_thread is None:
+                    self._sync_thread = threading.Thread(target=self._sync_loop, daemon=True,
+                                                         name=f"quiz-eventlog:{self.storage.data_dir}")
+                    self._sync_thread.start()
+
+    def _sync_loop(self):
+        # Gruppen-fsync: spätestens FSYNC_EVERY_SEC nach einem nicht synchronen Event
+        while True:
+            self._sync_wake.wait()
+            if self._closed:
+                return
+            time.sleep(FSYNC_EVERY_SEC)
+            self._sync_wake.clear()
+            self.sync()
+
+    def sync(self):
+        with self._lock:
+            if self._unsynced and self._fd is not None:
+                try:
+                    os.fsync(self._fd)
+                except OSError as e:
+                    _log(f"{self.storage.data_dir}: fsync des Event-Logs fehlgeschlagen: {e}")
+                    return
+                self._unsynced = False
+
+    def close(self):
+        # Threads beenden, Rest fsyncen, Log und geteilte Sperre auf events.live freigeben
+        self._closed = True
+        self._sync_wake.set()
+        for t in (self._snapshot_thread, self._sync_thread):
+            if t is not None:
+                t.join()
+        self.sync()
+        with self._lock:
+            for fd in (self._fd, self._live_fd):
+                if fd is not None:
+                    os.close(fd)
+            self._fd = self._live_fd = None
+
+    def state(self, op, state):
+        self.append({"k": "s", "op": op, "st": state}, sync=True)
+
+    def rows(self, table, rows):
+        if rows:
+            self.append({"k": "r", "t": table, "rows": list(rows)}, sync=len(rows) > 1)
+
+    def presence(self, round_id, player, phase, ts):
+        self.append({"k": "p", "r": int(round_id), "p": str(player), "ph": phase, "ts": round(ts, 3)})
+
+    # ---------- Snapshots ----------
+    def _read_snapshot(self):
+        try:
+            with open(self.snap_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def snapshot(self):
+        # Alles bis hier steht auf der Platte (erst eigene Queue und Präsenz schreiben), dann
+        # rotieren: Snapshot zuerst, damit ein Absturz dazwischen nichts unabgedeckt lässt
+        from presence import registry_for
+        self.storage.flush_writes()
+        registry_for(self.storage).snapshot()
+        self.sync()
+        with self.storage.locked("events"):
+            closed = segments(self.storage.data_dir)
+            seg = (closed[-1] if closed else 0) + 1
+            has_log = os.path.exists(self.path) and os.path.getsize(self.path) > 0
+            if not has_log:
+                seg -= 1
+            snap = {"segment": seg, "at": time.time(), "state": self.storage.load_state()}
+            write_atomic(self.snap_path, lambda f: json.dump(snap, f, ensure_ascii=False))
+            if has_log:
+                os.replace(self.path, segment_path(self.storage.data_dir, seg))
+                closed.append(seg)
+            if KEEP_SEGMENTS > 0:
+                for old in closed[:-KEEP_SEGMENTS]:
+                    os.remove(segment_path(self.storage.data_dir, old))
+        with self._lock:
+            self._since_snapshot = 0
+            self.stats["snapshots"] += 1
+        return snap
+
+    def _snapshot_bg(self):
+        try:
+            self.snapshot()
+        except Exception as e:
+            _log(f"{self.storage.data_dir}: Snapshot fehlgeschlagen: {e}")
+        finally:
+            with self._lock:
+                self._snapshotting = False
+
+    # ---------- Wiederanlauf ----------
+    def _claim_live(self):
+        # True, wenn kein anderer Prozess den Raum offen hat; danach hält dieser Prozess
+        # (wie jeder laufende) eine geteilte Sperre auf events.live
+        if fcntl is None:
+            return True
+        self._live_fd = os.open(os.path.join(self.storage.data_dir, LIVE_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._live_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            alone = True
+        except OSError:
+            alone = False
+        fcntl.flock(self._live_fd, fcntl.LOCK_SH)
+        return alone
+
+    def recover(self):
+        # Einmal pro Prozess vor dem ersten Zugriff: Snapshot laden, events.log nachspielen
+        t0 = time.perf_counter()
+        alone = self._claim_live()
+        snap = self._read_snapshot()
+        if snap is None and not os.path.exists(self.path) and not segments(self.storage.data_dir):
+            # Raum ohne Log (neu oder von vor dem Log): Ausgangspunkt festhalten
+            self.snapshot()
+            self.stats["recovery"] = {"events": 0, "rows": 0, "state_restored": False, "ms": 0.0, "alone": alone}
+            return self.stats["recovery"]
+        snap = snap or {"segment": 0, "state": None}
+        state, seen, beats, events, tail = snap["state"], {}, [], 0, 0
+        # letztes Segment nur für Einreichungen (Queues anderer Prozesse beim Snapshot)
+        prev = segment_path(self.storage.data_dir, snap.get("segment", 0))
+        for end, ev in iter_events(prev):
+            events += 1
+            if ev["k"] == "r" and ev.get("t") in ROW_TABLES:
+                seen.setdefault(ev["t"], []).extend(ev["rows"])
+        end = 0
+        for end, ev in iter_events(self.path):
+            events += 1
+            if ev["k"] == "s":
+                state = ev["st"]
+            elif ev["k"] == "r" and ev.get("t") in ROW_TABLES:
+                seen.setdefault(ev["t"], []).extend(ev["rows"])
+            elif ev["k"] == "p":
+                beats.append(ev)
+        tail = end
+        torn = os.path.exists(self.path) and os.path.getsize(self.path) > end
+        restored = rows = 0
+        self._replaying.on = True
+        try:
+            if alone:
+                if torn:  # halbe letzte Zeile abschneiden, sonst klebt das nächste Event daran
+                    with self.storage.locked("events"):
+                        os.truncate(self.path, end)
+                rows = self._replay_rows(seen)
+                restored = self._replay_state(state)
+            self._replay_presence(beats)
+        finally:
+            self._replaying.on = False
+        ms = (time.perf_counter() - t0) * 1000
+        rec = {"events": events, "rows": rows, "state_restored": bool(restored), "torn": torn,
+               "tail_bytes": tail, "ms": round(ms, 1), "alone": alone}
+        self.stats["recovery"] = rec
+        _log(f"{self.storage.data_dir}: Event-Log: {events} Events ab Snapshot ({tail / 1024:.0f} KB) in "
+             f"{ms:.1f} ms nachgespielt" + (f", {rows} Einreichungen nachgetragen" if rows else "")
+             + (", State wiederhergestellt" if restored else "") + (", halbe Zeile verworfen" if torn else ""))
+        return rec
+
+    def _replay_rows(self, seen):
+        # Idempotent: nur Zeilen, die noch nicht in ihrer Partition stehen
+        n = 0
+        for table, rows in seen.items():
+            missing, ids, keys = [], {}, set()
+            for row in rows:
+                rid = int(row["round_id"])
+                if table == "questions":
+                    if rid not in ids:
+                        df = self.storage.load_df(table, rid)
+                        ids[rid] = set() if df.empty else set(df["id"].astype(int))
+                    if int(row["id"]) in ids[rid]:
+                        continue
+                    ids[rid].add(int(row["id"]))
+                else:
+                    key = (rid, str(row["player"]), int(row["question_id"]))
+                    if key in keys or self.storage.exists_row(table, round_id=rid, player=row["player"],
+                                                              question_id=row["question_id"]):
+                        continue
+                    keys.add(key)
+                missing.append(row)
+            if missing:
+                self.storage.append_rows(missing, table)
+                n += len(missing)
+        return n
+
+    def _replay_state(self, state):
+        # state.json (bzw. SQLite) älter als das Log oder unlesbar -> Stand aus dem Log
+        if not state:
+            return False
+        try:
+            cur = self.storage.load_state()
+        except (ValueError, OSError):
+            cur = None
+        if cur is not None and str(cur.get("last_update") or "") >= str(state.get("last_update") or ""):
+            return False
+        self.storage.save_state(state)
+        return True
+
+    def _replay_presence(self, beats):
+        from presence import registry_for
+        reg = registry_for(self.storage)
+        for ev in beats:
+            reg.beat(ev["r"], ev["p"], ev["ph"], now=ev["ts"])
+
+    def pending(self):
+        # Events seit dem letzten Snapshot dieses Prozesses (für das Host-Dashboard)
+        return self._since_snapshot
+
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+def log_for(storage):
+    with _logs_lock:
+        log = _logs.get(id(storage))
+        if log is None:
+            log = _logs[id(storage)] = EventLog(storage)
+        return log
+
+def close_log(storage):
+    with _logs_lock:
+        log = _logs.pop(id(storage), None)
+    if log is not None:
+        log.close()
+
+
+def rebuild(src_dir, dst_dir, backend="csv"):
+    # Neues Datenverzeichnis nur aus dem Log (alle Segmente + events.log): State,
+    # Partitionen, Präsenz; Deck/Saison/Index entstehen daraus
+    from engine import initial_state
+    from presence import registry_for
+    from storage import open_storage
+    closed = segments(src_dir)
+    if closed and closed[0] != 1:
+        raise ValueError(f"Log unvollständig: ältestes Segment ist {closed[0]} "
+                         "(QUIZ_EVENTLOG_KEEP=0 bewahrt alle Segmente auf)")
+    sources = [segment_path(src_dir, n) for n in closed] + [os.path.join(src_dir, LOG_NAME)]
+    storage = open_storage(dst_dir, backend)
+    storage.bootstrap(initial_state())
+    log = log_for(storage)
+    state, batches, n = None, {}, 0
+    log._replaying.on = True
+    try:
+        for src in sources:
+            for _, ev in iter_events(src):
+                n += 1
+                if ev["k"] == "s":
+                    state = ev["st"]
+                elif ev["k"] == "r":
+                    batches.setdefault(ev["t"], []).extend(ev["rows"])
+                elif ev["k"] == "p":
+                    registry_for(storage).beat(ev["r"], ev["p"], ev["ph"], now=ev["ts"])
+        for table, rows in batches.items():
+            storage.append_rows(rows, table)
+        if state:
+            storage.save_state(state)
+        registry_for(storage).snapshot()
+    finally:
+        log._replaying.on = False
+    log.snapshot()  # neues Log beginnt beim nachgebauten Stand
+    return n
+
+
+def main(argv):
+    import argparse
+    ap = argparse.ArgumentParser(prog="eventlog.py")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rb = sub.add_parser("rebuild")
+    rb.add_argument("data_dir")
+    rb.add_argument("target_dir")
+    rb.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    args = ap.parse_args(argv)
+    if os.path.exists(os.path.join(args.target_dir, SNAP_NAME)):
+        ap.error(f"{args.target_dir} enthält schon ein Log")
+    t0 = time.perf_counter()
+    try:
+        n = rebuild(args.data_dir, args.target_dir, args.backend)
+    except ValueError as e:
+        ap.error(str(e))
+    print(f"{n} Events nach {args.target_dir} nachgespielt ({(time.perf_counter() - t0) * 1000:.0f} ms)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
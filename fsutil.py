@@ -0,0 +1,22 @@
+# Kleine Datei-Helfer ohne pandas: atomares Schreiben und Server-Log. Von storage.py und
+# den Modulen, die engine.py beim Import lädt (eventlog.py), gemeinsam genutzt.
+import os, sys, threading
+
+
+def write_atomic(path, write, mode="w"):
+    # In Temp-Datei schreiben, fsync, dann atomar umbenennen
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, mode, **({} if "b" in mode else {"encoding": "utf-8", "newline": ""})) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def log(msg):
+    # Server-Log (stderr), z. B. Migrationen und Wiederanlauf beim Start
+    print(f"[quiz] {msg}", file=sys.stderr, flush=True)
@@ -0,0 +1,144 @@
+# Bilder und Audio zu Fragen: inhaltsadressiert unter data/<RAUM>/media/<ab>/<sha256>.<ext>,
+# gleiche Dateien liegen also nur einmal auf der Platte. Die Frage speichert nur die Referenz
+# "<sha256>.<ext>" (Spalte questions.media). Für Bilder wird beim Hochladen einmal ein
+# Vorschaubild (max. DISPLAY_PX breit, THUMB_FORMATS) berechnet; angezeigt wird dann nur dieses.
+#
+# Gelesen wird über einen begrenzten LRU-Cache im Prozess (MAX_CACHE_BYTES), der unveränderliche
+# bytes hält: ein Rerun in der Antwort-Phase reicht dasselbe Objekt an st.image/st.audio weiter –
+# kein erneutes Lesen, keine Kopie, kein Dekodieren/Skalieren.
+import hashlib, io, os, threading
+from collections import OrderedDict
+from fsutil import write_atomic
+
+try:
+    from PIL import Image  # kommt mit streamlit; ohne PIL wird das Original angezeigt
+except ImportError:
+    Image = None
+
+IMAGE_TYPES = {"png": "image/png", "jpg": "image/jpeg", "jpeg": "image/jpeg", "gif": "image/gif", "webp": "image/webp"}
+AUDIO_TYPES = {"mp3": "audio/mpeg", "ogg": "audio/ogg", "wav": "audio/wav", "m4a": "audio/mp4"}
+MAX_UPLOAD_BYTES = 8 * 1024 * 1024
+DISPLAY_PX = 640                 # Breite des Vorschaubilds (st.image skaliert dann nicht mehr)
+# Format des Vorschaubilds je Original: Transparenz bleibt erhalten (PNG/WebP; GIF -> PNG),
+# animierte Bilder bekommen keins und werden im Original angezeigt
+THUMB_FORMATS = {"png": ("png", "PNG"), "jpg": ("jpg", "JPEG"), "jpeg": ("jpg", "JPEG"), "gif": ("png", "PNG"), "webp": ("webp", "WEBP")}
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def media_ext(filename):
+    ext = os.path.splitext(str(filename))[1].lower().lstrip(".")
+    return ext if ext in IMAGE_TYPES or ext in AUDIO_TYPES else None
+
+def kind(ref):
+    # "image" | "audio" | None für eine Referenz aus questions.media
+    if not isinstance(ref, str) or "." not in ref:
+        return None
+    ext = ref.rsplit(".", 1)[1]
+    return "image" if ext in IMAGE_TYPES else "audio" if ext in AUDIO_TYPES else None
+
+
+class MediaStore:
+    def __init__(self, storage):
+        self.root = os.path.join(storage.data_dir, "media")
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()   # Pfad -> bytes
+        self._cache_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0, "stored": 0, "deduped": 0}
+
+    def path(self, ref, thumb=False):
+        sha, ext = ref.rsplit(".", 1)
+        if thumb:
+            ext = "thumb." + THUMB_FORMATS[ext][0]
+        return os.path.join(self.root, sha[:2], f"{sha}.{ext}")
+
+    # ---------- Hochladen ----------
+    def put(self, data, filename):
+        # Speichert die Datei (falls noch nicht vorhanden) und gibt die Referenz zurück
+        ext = media_ext(filename)
+        if ext is None:
+            raise ValueError("Dateityp nicht unterstützt: " + ", ".join(sorted({**IMAGE_TYPES, **AUDIO_TYPES})))
+        if len(data) > MAX_UPLOAD_BYTES:
+            raise ValueError(f"Datei zu groß (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)")
+        ext = "jpg" if ext == "jpeg" else ext
+        ref = f"{hashlib.sha256(data).hexdigest()}.{ext}"
+        path = self.path(ref)
+        if os.path.exists(path):
+            self.stats["deduped"] += 1
+            return ref
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if kind(ref) == "image":
+            thumb = _thumbnail(data, ext)  # vor dem Original: wer die Referenz sieht, findet beides
+            if thumb is not None:
+                write_atomic(self.path(ref, thumb=True), lambda f: f.write(thumb), "wb")
+        write_atomic(path, lambda f: f.write(data), "wb")
+        self.stats["stored"] += 1
+        return ref
+
+    # ---------- Anzeigen ----------
+    def display(self, ref):
+        # Bytes für st.image/st.audio: Vorschaubild bzw. Audiodatei, aus dem LRU-Cache.
+        # None, wenn die Datei fehlt (z. B. Frage aus einem anderen Raum importiert).
+        if kind(ref) is None:
+            return None
+        thumb = self.path(ref, thumb=True)
+        return self._get(thumb if kind(ref) == "image" and os.path.exists(thumb) else self.path(ref))
+
+    def _get(self, path):
+        with self._lock:
+            buf = self._cache.get(path)
+            if buf is not None:
+                self._cache.move_to_end(path)
+                self.stats["hits"] += 1
+                return buf
+        try:
+            with open(path, "rb") as f:
+                buf = f.read()
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self.stats["misses"] += 1
+            if path not in self._cache:
+                self._cache[path] = buf
+                self._cache_bytes += len(buf)
+            while self._cache_bytes > MAX_CACHE_BYTES and len(self._cache) > 1:
+                _, old = self._cache.popitem(last=False)
+                self._cache_bytes -= len(old)
+                self.stats["evicted"] += 1
+            return self._cache[path]
+
+    def cache_info(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._cache), bytes=self._cache_bytes)
+
+
+def _thumbnail(data, ext):
+    # Einmal beim Hochladen: auf DISPLAY_PX verkleinert, Format nach THUMB_FORMATS
+    if Image is None:
+        return None
+    try:
+        img = Image.open(io.BytesIO(data))
+        if getattr(img, "is_animated", False):
+            return None  # ein Einzelbild wäre keine Vorschau der Animation
+        img.thumbnail((DISPLAY_PX, DISPLAY_PX * 4))
+        out = io.BytesIO()
+        fmt = THUMB_FORMATS[ext][1]
+        if fmt == "JPEG":
+            img.convert("RGB").save(out, "JPEG", quality=85)
+        elif fmt == "PNG":
+            img.save(out, "PNG", optimize=True)
+        else:
+            img.save(out, fmt, quality=85)
+        return out.getvalue()
+    except Exception:
+        return None  # kaputtes Bild: Original wird angezeigt (bzw. st.image meldet den Fehler)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def media_for(storage):
+    with _stores_lock:
+        store = _stores.get(id(storage))
+        if store is None:
+            store = _stores[id(storage)] = MediaStore(storage)
+        return store
@@ -0,0 +1,182 @@
+# Fragenpakete: Import von CSV/JSONL-Dateien (zeilenweise gelesen und geprüft, IDs als Block
+# reserviert, ein einziger Batch-Append) und Export beliebiger Runden als Strom – im Speicher
+# liegt höchstens eine Runde.
+#
+#   python packs.py import DATA_DIR pack.csv [--round N] [--author NAME]
+#   python packs.py export DATA_DIR [--rounds 1,2] [--format csv|jsonl] > fragen.jsonl
+import csv, io, json, os, sys, time
+from datetime import datetime
+from dupes import index_for
+from eventlog import log_for
+
+FIELDS = ["question", "correct", "wrong1", "wrong2", "wrong3", "difficulty"]
+REQUIRED = ("question", "correct", "wrong1")
+MAX_LEN = {"question": 300, "correct": 120, "wrong1": 120, "wrong2": 120, "wrong3": 120, "difficulty": 20}
+MAX_ROWS = 20000            # mehr Zeilen pro Paket werden abgelehnt
+MAX_REPORTED_ERRORS = 50    # so viele Fehler werden einzeln gemeldet (gezählt werden alle)
+PACK_PREFIX = "📦 "          # vor dem angezeigten Autor importierter Fragen
+
+
+def pack_name(name):
+    # Paketname für questions.pack (daran erkennt die Wertung Paketfragen, nicht am Autor)
+    name = str(name).strip()
+    if name.startswith(PACK_PREFIX.strip()):
+        name = name[len(PACK_PREFIX.strip()):].strip()
+    return name or "Paket"
+
+def pack_author(name):
+    return PACK_PREFIX + pack_name(name)
+
+
+def pack_format(filename):
+    return "jsonl" if str(filename).lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def iter_pack(stream, fmt):
+    # (Zeilennummer, dict) aus einem Text-Stream; kaputte JSON-Zeilen als (n, None)
+    if fmt == "jsonl":
+        for n, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                yield n, None
+                continue
+            yield n, obj if isinstance(obj, dict) else None
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def validate(raw):
+    # -> (bereinigte Zeile, None) oder (None, Fehlertext)
+    if raw is None:
+        return None, "keine gültige JSON-Zeile"
+    row = {}
+    for f in FIELDS:
+        v = raw.get(f)
+        row[f] = "" if v is None else str(v).strip()
+    missing = [f for f in REQUIRED if not row[f]]
+    if missing:
+        return None, f"Pflichtfeld fehlt: {', '.join(missing)}"
+    too_long = [f for f in FIELDS if len(row[f]) > MAX_LEN[f]]
+    if too_long:
+        return None, "zu lang: " + ", ".join(f"{f} (max {MAX_LEN[f]})" for f in too_long)
+    answers = [row[f] for f in ("correct", "wrong1", "wrong2", "wrong3") if row[f]]
+    if len({a.casefold() for a in answers}) != len(answers):
+        return None, "Antworten nicht eindeutig"
+    row["difficulty"] = row["difficulty"] or "n/a"
+    return row, None
+
+
+def _checked(rows):
+    # Datei-Fehler (Kodierung, kaputtes CSV) als ValueError mit lesbarer Meldung
+    try:
+        yield from rows
+    except UnicodeDecodeError:
+        raise ValueError("Datei ist nicht UTF-8-kodiert") from None
+    except csv.Error as e:
+        raise ValueError(f"keine gültige CSV-Datei: {e}") from None
+
+
+def import_pack(storage, stream, round_id, author, fmt="csv"):
+    # Prüft das ganze Paket, schreibt aber nur, wenn mindestens eine Zeile gültig ist:
+    # IDs als ein Block, alle Fragen in einem Append (CSV: ein fsync, SQLite: eine Transaktion)
+    t0 = time.perf_counter()
+    pack, author = pack_name(author), pack_author(author)
+    valid, errors, n_errors, seen = [], [], 0, set()
+    for line, raw in _checked(iter_pack(stream, fmt)):
+        row, err = validate(raw)
+        if row is not None and row["question"].casefold() in seen:
+            row, err = None, "doppelt im Paket"
+        if row is None:
+            n_errors += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append((line, err))
+            continue
+        seen.add(row["question"].casefold())
+        valid.append(row)
+        if len(valid) > MAX_ROWS:
+            raise ValueError(f"Paket zu groß (max {MAX_ROWS} Fragen)")
+    first_id = None
+    if valid:
+        first_id = storage.next_id("questions", len(valid))
+        now = datetime.utcnow().isoformat()
+        rows = [dict(row, id=first_id + i, round_id=int(round_id), author=author, pack=pack, created_at=now)
+                for i, row in enumerate(valid)]
+        log_for(storage).rows("questions", rows)  # Write-ahead, siehe eventlog.py
+        storage.append_rows(rows, "questions")
+    similar = index_for(storage).add_many(rows) if valid else 0  # Ähnlichkeits-Index, siehe dupes.py
+    return {"imported": len(valid), "errors": errors, "error_count": n_errors, "similar": similar,
+            "first_id": first_id, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+
+def _plain(v):
+    # JSON-taugliche Werte (numpy-Skalare, NaN aus leeren CSV-Feldern)
+    if hasattr(v, "item"):
+        v = v.item()
+    if isinstance(v, float) and v != v:
+        return ""
+    return v
+
+
+def export_questions(storage, out, round_ids=None, fmt="jsonl"):
+    # Schreibt Fragen als Strom nach `out` (Text); gibt die Anzahl zurück
+    from storage import SCHEMAS
+    cols = SCHEMAS["questions"]
+    writer = None
+    if fmt == "csv":
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(cols)
+    n = 0
+    for row in storage.iter_rows("questions", round_ids):
+        values = [_plain(row.get(c, "")) for c in cols]
+        if writer is not None:
+            writer.writerow(values)
+        else:
+            out.write(json.dumps(dict(zip(cols, values)), ensure_ascii=False) + "\n")
+        n += 1
+    return n
+
+
+def main(argv):
+    import argparse
+    from engine import open_game
+    ap = argparse.ArgumentParser(prog="packs.py")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import")
+    imp.add_argument("data_dir")
+    imp.add_argument("pack")
+    imp.add_argument("--round", type=int, help="Standard: aktuelle Runde (muss schon gestartet sein)")
+    imp.add_argument("--author", help="Standard: Dateiname (immer mit 📦 davor)")
+    imp.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    exp = sub.add_parser("export")
+    exp.add_argument("data_dir")
+    exp.add_argument("--rounds", help="z. B. 1,2,5 (Standard: alle)")
+    exp.add_argument("--format", choices=["csv", "jsonl"], default="jsonl")
+    exp.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    args = ap.parse_args(argv)
+    storage = open_game(args.data_dir, args.backend).storage
+    if args.cmd == "import":
+        current = int(storage.load_state()["round_id"])
+        rid = args.round if args.round is not None else current
+        if not 1 <= rid <= current:
+            # Runde 0 ist die Lobby eines frischen Raums und wird nie gespielt
+            ap.error(f"Runde {rid} läuft nicht (gestartet: 1–{current}); erst eine Runde starten oder --round angeben"
+                     if current else "noch keine Runde gestartet; erst eine Runde starten")
+        author = pack_author(args.author or os.path.splitext(os.path.basename(args.pack))[0])
+        with open(args.pack, "r", encoding="utf-8-sig", newline="") as f:
+            report = import_pack(storage, f, rid, author, pack_format(args.pack))
+        print(json.dumps(report, ensure_ascii=False, indent=2), file=sys.stderr)
+    else:
+        rounds = [int(r) for r in args.rounds.split(",")] if args.rounds else None
+        out = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", newline="")
+        n = export_questions(storage, out, rounds, args.format)
+        out.flush()
+        print(f"{n} Fragen exportiert", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,198 @@
+# Präsenz-Register im Speicher: Heartbeats landen hier statt bei jedem Tick in players.csv.
+# Ein Register pro Storage, geteilt von allen Sessions des Prozesses; die players-Partition
+# einer Runde ist nur noch der periodische Snapshot (und die Quelle beim ersten Zugriff).
+import threading, time
+from datetime import datetime, timezone
+from eventlog import log_for
+
+ACTIVE_WINDOW_SEC = 10.0    # aktiv, wenn letzter Heartbeat höchstens so alt ist
+SNAPSHOT_EVERY_SEC = 4.0    # spätestens dann wird der Snapshot geschrieben (< ACTIVE_WINDOW_SEC,
+                            # sonst gelten Spieler anderer Worker zwischendurch als inaktiv)
+SNAPSHOT_DEBOUNCE_SEC = 0.5 # Phasenwechsel vieler Spieler zu einem Schreibvorgang bündeln
+RELOAD_CHECK_SEC = 2.0      # so oft wird höchstens nach Snapshots anderer Worker geschaut
+
+
+class PresenceRecord:
+    __slots__ = ("round_id", "player", "joined_at", "last_seen", "phase")
+
+    def __init__(self, round_id, player, joined_at, last_seen, phase):
+        self.round_id = round_id
+        self.player = player
+        self.joined_at = joined_at  # Epoch-Sekunden
+        self.last_seen = last_seen  # Epoch-Sekunden
+        self.phase = phase
+
+    def is_active(self, now, window=ACTIVE_WINDOW_SEC):
+        return (now - self.last_seen) <= window
+
+
+class PresenceRegistry:
+    def __init__(self, storage):
+        self.storage = storage
+        self._records = {}  # (round_id, player) -> PresenceRecord
+        self._lock = threading.Lock()
+        self._loaded = {}      # Runde -> Stempel des zuletzt eingelesenen Snapshots
+        self._checked = {}     # Runde -> monotonic() des letzten Stempel-Vergleichs
+        self._dirty = set()    # Runden mit ungespeicherten Heartbeats
+        self._flush_now = threading.Event()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._snapshot_loop, name=f"quiz-presence:{storage.data_dir}", daemon=True)
+        self._thread.start()
+
+    def _ensure_round(self, round_id):
+        # Snapshot der Runde (neu) einlesen, wenn er sich geändert hat – mehrere Worker teilen
+        # sich die players-Partition, jeder sieht so auch die Spieler der anderen
+        # (gedrosselt: höchstens alle RELOAD_CHECK_SEC ein stat, sonst nur Speicher)
+        round_id = int(round_id)
+        now = time.monotonic()
+        if round_id in self._loaded and now - self._checked.get(round_id, 0.0) < RELOAD_CHECK_SEC:
+            return
+        self._checked[round_id] = now
+        stamp = self._stamp(round_id)
+        if self._loaded.get(round_id) == stamp:
+            return
+        df = self.storage.load_df("players", round_id)
+        with self._lock:
+            self._merge(round_id, df.to_dict("records"))
+            self._loaded[round_id] = stamp
+
+    def _stamp(self, round_id):
+        from storage import partition_name  # lädt pandas; engine.py importiert presence ohne
+        return self.storage.change_token([partition_name("players", round_id)])
+
+    def _merge(self, round_id, rows):
+        # Aufrufer hält self._lock; der jüngere Heartbeat gewinnt
+        for r in rows:
+            key = (round_id, str(r["player"]))
+            phase = r.get("phase")
+            phase = phase if isinstance(phase, str) else ""
+            joined, seen = iso_to_ts(r.get("joined_at")), iso_to_ts(r.get("last_seen"))
+            rec = self._records.get(key)
+            if rec is None:
+                self._records[key] = PresenceRecord(round_id, key[1], joined, seen, phase)
+            elif seen > rec.last_seen:
+                rec.last_seen, rec.phase = seen, phase
+                rec.joined_at = min(rec.joined_at, joined) if joined else rec.joined_at
+
+    def beat(self, round_id, player, phase, now=None):
+        now = time.time() if now is None else now
+        round_id = int(round_id)
+        self._ensure_round(round_id)
+        key = (round_id, player)
+        with self._lock:
+            rec = self._records.get(key)
+            if rec is None:
+                self._records[key] = PresenceRecord(round_id, player, now, now, phase)
+                changed = True
+            else:
+                rec.last_seen = now
+                changed = rec.phase != phase
+                rec.phase = phase
+            self._dirty.add(round_id)
+        if changed:
+            # Beitritt / Phasenwechsel: ins Event-Log, Watcher wecken und bald persistieren
+            log_for(self.storage).presence(round_id, player, phase, now)
+            self.storage.touch("presence")
+            self._flush_now.set()
+        return changed
+
+    def players(self, round_id):
+        self._ensure_round(round_id)
+        with self._lock:
+            return [r for r in self._records.values() if r.round_id == round_id]
+
+    def active(self, round_id, phase=None, now=None, window=ACTIVE_WINDOW_SEC):
+        now = time.time() if now is None else now
+        self._ensure_round(round_id)
+        with self._lock:
+            return [r.player for r in self._records.values()
+                    if r.round_id == round_id and r.is_active(now, window) and (phase is None or r.phase == phase)]
+
+    def token(self, round_id, now=None):
+        # Sichtbarer Zustand (wer ist aktiv in welcher Phase) – für den Sync-Watcher
+        now = time.time() if now is None else now
+        self._ensure_round(round_id)
+        with self._lock:
+            return frozenset((r.player, r.phase, r.is_active(now)) for r in self._records.values()
+                             if r.round_id == round_id)
+
+    def snapshot(self):
+        with self._lock:
+            if not self._dirty:
+                return False
+            by_round = {rid: [] for rid in self._dirty}
+            for r in self._records.values():
+                if r.round_id in by_round:
+                    by_round[r.round_id].append({"round_id": r.round_id, "player": r.player,
+                                                 "joined_at": ts_to_iso(r.joined_at),
+                                                 "last_seen": ts_to_iso(r.last_seen), "phase": r.phase})
+            self._dirty.clear()
+        import pandas as pd
+        for rid, rows in by_round.items():
+            # Unter der Tabellen-Sperre mit der Platte zusammenführen: andere Worker schreiben
+            # ihre Spieler in dieselbe Partition
+            with self.storage.locked("players"):
+                disk = self.storage.load_df("players", rid)
+                mine = {r["player"] for r in rows}
+                for r in disk.to_dict("records"):
+                    player = str(r["player"])
+                    if player not in mine:
+                        rows.append(dict(r, player=player))
+                    else:
+                        own = next(x for x in rows if x["player"] == player)
+                        if iso_to_ts(r.get("last_seen")) > iso_to_ts(own["last_seen"]):
+                            own.update(last_seen=r.get("last_seen"), phase=r.get("phase"))
+                self.storage.save_df(pd.DataFrame(rows, columns=["round_id","player","joined_at","last_seen","phase"]), "players", rid)
+                # Der eigene Snapshot enthält alles von der Platte: nicht erneut einlesen
+                stamp = self._stamp(rid)
+                with self._lock:
+                    self._merge(rid, rows)
+                    self._loaded[rid] = stamp
+        return True
+
+    def _snapshot_loop(self):
+        while not self._closed.is_set():
+            if self._flush_now.wait(SNAPSHOT_EVERY_SEC) and not self._closed.is_set():
+                time.sleep(SNAPSHOT_DEBOUNCE_SEC)
+                self._flush_now.clear()
+            try:
+                self.snapshot()
+            except Exception:
+                pass
+
+    def close(self):
+        # Snapshot-Thread beenden; sein letzter Durchlauf schreibt offene Heartbeats
+        self._closed.set()
+        self._flush_now.set()
+        self._thread.join()
+
+
+def iso_to_ts(iso):
+    # players.csv speichert naive UTC-Zeitstempel (utcnow().isoformat())
+    try:
+        dt = datetime.fromisoformat(str(iso).replace("Z", ""))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+    except Exception:
+        return 0.0
+
+def ts_to_iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+def registry_for(storage):
+    with _registries_lock:
+        reg = _registries.get(id(storage))
+        if reg is None:
+            reg = _registries[id(storage)] = PresenceRegistry(storage)
+        return reg
+
+def close_registry(storage):
+    with _registries_lock:
+        reg = _registries.pop(id(storage), None)
+    if reg is not None:
+        reg.close()
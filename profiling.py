@@ -0,0 +1,125 @@
+# Leichtgewichtiges Profiling des Hot Paths: pro (gesampeltem) Rerun Wandzeit, gelesene/
+# geschriebene Bytes und geparste Zeilen der Storage-Aufrufe und Views; eine JSON-Zeile pro
+# Rerun in <DATA_DIR>/requests.jsonl. Nicht gesampelte Reruns kosten nur einen Attribut-Check.
+import json, os, random, threading, time
+from collections import deque
+
+SAMPLE_RATE = float(os.environ.get("QUIZ_PROFILE_SAMPLE", "0.05"))  # 0 = aus
+WINDOW_SEC = 60.0       # Zeitfenster für das Host-Panel
+
+_local = threading.local()      # aktiver Rerun des Script-Threads (None = nicht gesampelt)
+_recent = deque(maxlen=5000)    # (ts, room, phase, wall_ms, read_bytes, write_bytes)
+_log_lock = threading.Lock()
+_IO_PATH = "/proc/thread-self/io" if os.path.exists("/proc/thread-self/io") else None
+
+
+def _thread_io():
+    # Linux: Bytes, die dieser Thread gelesen/geschrieben hat; sonst (0, 0)
+    if _IO_PATH is None:
+        return 0, 0
+    try:
+        with open(_IO_PATH, "rb") as f:
+            vals = dict(line.split(b": ") for line in f.read().splitlines())
+        return int(vals[b"rchar"]), int(vals[b"wchar"])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+class _Rerun:
+    __slots__ = ("started", "last", "meta", "calls", "log_path")
+
+    def __init__(self, log_path, meta):
+        self.started = self.last = time.perf_counter()
+        self.meta = meta
+        self.calls = {}
+        self.log_path = log_path
+
+
+def begin_rerun(log_path, **meta):
+    # Ein per st.rerun() abgebrochener Lauf wird hier nachträglich abgeschlossen
+    pending = getattr(_local, "rerun", None)
+    if pending is not None:
+        _finish(pending, ended_by="rerun")
+    _local.rerun = _Rerun(log_path, meta) if SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE else None
+
+
+def end_rerun(**meta):
+    rec = getattr(_local, "rerun", None)
+    _local.rerun = None
+    if rec is not None:
+        rec.meta.update(meta)
+        rec.last = time.perf_counter()
+        _finish(rec, ended_by="end")
+
+
+def annotate(**meta):
+    rec = getattr(_local, "rerun", None)
+    if rec is not None:
+        rec.meta.update(meta)
+
+
+def profiled(name):
+    def deco(fn):
+        def wrapper(*args, **kwargs):
+            rec = getattr(_local, "rerun", None)
+            if rec is None:
+                return fn(*args, **kwargs)
+            rb0, wb0 = _thread_io()
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                t1 = time.perf_counter()
+                rb1, wb1 = _thread_io()
+                c = rec.calls.setdefault(name, {"n": 0, "ms": 0.0, "read_bytes": 0, "write_bytes": 0})
+                c["n"] += 1
+                c["ms"] += (t1 - t0) * 1000
+                c["read_bytes"] += rb1 - rb0
+                c["write_bytes"] += wb1 - wb0
+                rec.last = t1
+        wrapper.__name__ = fn.__name__
+        wrapper.__wrapped__ = fn
+        return wrapper
+    return deco
+
+
+def note_parse(rows):
+    # Vom Storage bei jedem Cache-Miss gemeldet: so viele Zeilen wurden wirklich geparst
+    rec = getattr(_local, "rerun", None)
+    if rec is not None:
+        rec.meta["rows_parsed"] = rec.meta.get("rows_parsed", 0) + rows
+
+
+def _finish(rec, ended_by):
+    wall_ms = (rec.last - rec.started) * 1000
+    for c in rec.calls.values():
+        c["ms"] = round(c["ms"], 3)
+    storage_calls = [c for n, c in rec.calls.items() if not n.startswith("view_")]
+    read_bytes = sum(c["read_bytes"] for c in storage_calls)
+    write_bytes = sum(c["write_bytes"] for c in storage_calls)
+    line = {"ts": round(time.time(), 3), "wall_ms": round(wall_ms, 3), "ended_by": ended_by,
+            "read_bytes": read_bytes, "write_bytes": write_bytes, **rec.meta, "calls": rec.calls}
+    _recent.append((time.time(), rec.meta.get("room"), rec.meta.get("phase"), wall_ms, read_bytes, write_bytes))
+    try:
+        with _log_lock, open(rec.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+
+def summary(room=None, window=WINDOW_SEC):
+    # p50/p95 Rerun-Zeit und mittlere I/O pro Phase über das letzte Zeitfenster
+    cutoff = time.time() - window
+    by_phase = {}
+    for ts, r, phase, wall_ms, rb, wb in list(_recent):
+        if ts >= cutoff and (room is None or r == room):
+            by_phase.setdefault(phase or "?", []).append((wall_ms, rb, wb))
+    rows = []
+    for phase, vals in sorted(by_phase.items()):
+        walls = sorted(v[0] for v in vals)
+        rows.append({"Phase": phase, "Reruns": len(vals),
+                     "p50 ms": round(walls[len(walls) // 2], 1),
+                     "p95 ms": round(walls[min(len(walls) - 1, int(len(walls) * 0.95))], 1),
+                     "Ø gelesen KB": round(sum(v[1] for v in vals) / len(vals) / 1024, 1),
+                     "Ø geschrieben KB": round(sum(v[2] for v in vals) / len(vals) / 1024, 1)})
+    return rows
@@ -0,0 +1,97 @@
+# Punktewertung einer Runde: ein vektorisierter groupby-Durchlauf statt Schleife über Fragen,
+# Ergebnis gemerkt pro Datenstand (Versionsstempel von questions/answers/ratings).
+import threading
+import numpy as np
+import pandas as pd
+from storage import partition_name
+
+SCORE_TABLES = ["questions", "answers", "ratings"]
+COLUMNS = ["Name", "Spielerpunkte", "Autorenpunkte", "Gesamt"]
+
+_memo = {}  # (id(storage), round_id) -> (token, DataFrame)
+_memo_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0}
+
+
+def question_aggregates(qdf, adf, rdf):
+    # Pro Frage: N Antworten, C richtige, Sterne-Summe/-Anzahl
+    agg = qdf[["id", "author"]].copy()
+    agg["id"] = agg["id"].astype(int)
+    if not adf.empty:
+        by_q = adf.groupby("question_id")["is_correct"].agg(["size", "sum"])
+        agg["N"] = agg["id"].map(by_q["size"]).fillna(0).astype(int)
+        agg["C"] = agg["id"].map(by_q["sum"]).fillna(0).astype(int)
+    else:
+        agg["N"] = 0; agg["C"] = 0
+    if not rdf.empty:
+        by_r = rdf.groupby("question_id")["stars"].agg(["sum", "count"])
+        agg["stars_sum"] = agg["id"].map(by_r["sum"]).fillna(0.0).astype(float)
+        agg["stars_count"] = agg["id"].map(by_r["count"]).fillna(0).astype(int)
+    else:
+        agg["stars_sum"] = 0.0; agg["stars_count"] = 0
+    return agg
+
+
+def author_points(agg):
+    # 5·(N−C); 2 wenn keiner richtig lag; 0 wenn alle richtig; 0 ohne Antworten.
+    # Multiplikator 0.2·Ø-Sterne + 0.4 (ohne Bewertung: 3 Sterne)
+    N, C = agg["N"].to_numpy(), agg["C"].to_numpy()
+    base = np.where(N == 0, 0, np.where(C == 0, 2, np.where(C == N, 0, 5 * np.maximum(N - C, 0))))
+    cnt = agg["stars_count"].to_numpy()
+    stars_avg = np.where(cnt > 0, agg["stars_sum"].to_numpy() / np.maximum(cnt, 1), 3.0)
+    return pd.Series(base * (0.2 * stars_avg + 0.4), index=agg.index)
+
+
+def player_questions(qdf):
+    # Fragen aus Paketen (questions.pack gesetzt) zählen für die Spieler, ihr Autor bekommt
+    # aber keine Punkte
+    if qdf.empty or "pack" not in qdf.columns:
+        return qdf
+    return qdf[qdf["pack"].fillna("").astype(str) == ""]
+
+
+def score_round(qdf, adf, rdf, round_id):
+    qdf = qdf[qdf["round_id"] == round_id] if not qdf.empty else qdf
+    qdf = player_questions(qdf)
+    adf = adf[adf["round_id"] == round_id] if not adf.empty else adf
+    rdf = rdf[rdf["round_id"] == round_id] if not rdf.empty else rdf
+
+    if not adf.empty:
+        ppts = adf.groupby("player")["is_correct"].sum().mul(10).rename("Spielerpunkte")
+    else:
+        ppts = pd.Series(dtype=float, name="Spielerpunkte")
+
+    if not qdf.empty:
+        agg = question_aggregates(qdf, adf, rdf)
+        agg["author_points"] = author_points(agg)
+        apts = agg.groupby("author")["author_points"].sum().rename("Autorenpunkte")
+    else:
+        apts = pd.Series(dtype=float, name="Autorenpunkte")
+
+    total = pd.concat([ppts, apts], axis=1)
+    if "Spielerpunkte" not in total.columns: total["Spielerpunkte"] = 0.0
+    if "Autorenpunkte" not in total.columns: total["Autorenpunkte"] = 0.0
+    total = total.fillna(0.0)
+    total["Gesamt"] = total["Spielerpunkte"].astype(float) + total["Autorenpunkte"].astype(float)
+
+    if total.empty:
+        return pd.DataFrame(columns=COLUMNS)
+    total = total.sort_values("Gesamt", ascending=False).reset_index().rename(columns={"index": "Name"})
+    return total
+
+
+def compute_scores(storage, round_id):
+    # Gemerkt pro Runde und Datenstand; neu gerechnet nur nach einer Einreichung.
+    # Liest nur die Partition der Runde (bzw. ihr Archiv).
+    token = storage.change_token([partition_name(t, round_id) for t in SCORE_TABLES])
+    key = (id(storage), round_id)
+    with _memo_lock:
+        hit = _memo.get(key)
+        if hit is not None and hit[0] == token:
+            stats["hits"] += 1
+            return hit[1].copy()
+    df = score_round(*(storage.load_df(t, round_id) for t in SCORE_TABLES), round_id)
+    with _memo_lock:
+        stats["misses"] += 1
+        _memo[key] = (token, df)
+    return df.copy()
@@ -0,0 +1,94 @@
+# Saison-/Ewige Tabelle: beim Erreichen der Ergebnisse wird pro Runde und Spieler eine
+# Zusammenfassung geschrieben (Spieler-/Autorenpunkte, Antworten, Treffer, erhaltene
+# Sterne) – Tabelle round_stats. Die Saisonwertung ist dann nur noch ein groupby über diese
+# kleinen Zeilen; Antworten/Bewertungen alter Runden (Archive) werden nie wieder gelesen.
+from datetime import datetime
+import pandas as pd
+import scoring
+
+TABLE = "round_stats"
+COLUMNS = ["Name", "Runden", "Spielerpunkte", "Autorenpunkte", "Gesamt", "Trefferquote", "Ø Sterne"]
+
+
+def round_summary(qdf, adf, rdf, round_id):
+    # Eine Zeile pro Spieler/Autor der Runde
+    pts = scoring.score_round(qdf, adf, rdf, round_id).set_index("Name")
+    adf = adf[adf["round_id"] == round_id] if not adf.empty else adf
+    qdf = scoring.player_questions(qdf[qdf["round_id"] == round_id] if not qdf.empty else qdf)
+    out = pd.DataFrame(index=pts.index)
+    out["player_points"] = pts["Spielerpunkte"].astype(float)
+    out["author_points"] = pts["Autorenpunkte"].astype(float)
+    out["total"] = pts["Gesamt"].astype(float)
+    if not adf.empty:
+        by_p = adf.groupby("player")["is_correct"].agg(["size", "sum"])
+        out["answered"] = by_p["size"]
+        out["answered_correct"] = by_p["sum"]
+    if not qdf.empty:
+        agg = scoring.question_aggregates(qdf, adf, rdf[rdf["round_id"] == round_id] if not rdf.empty else rdf)
+        by_a = agg.groupby("author").agg(authored=("id", "size"), stars_sum=("stars_sum", "sum"),
+                                         stars_count=("stars_count", "sum"))
+        out = out.join(by_a, how="outer")
+    for col in ("answered", "answered_correct", "authored", "stars_count"):
+        out[col] = (out[col] if col in out.columns else pd.Series(0, index=out.index)).fillna(0).astype(int)
+    for col in ("player_points", "author_points", "total", "stars_sum"):
+        out[col] = (out[col] if col in out.columns else pd.Series(0.0, index=out.index)).fillna(0.0).astype(float)
+    out["round_id"] = int(round_id)
+    out["played_at"] = _played_at(adf, qdf)
+    return out.rename_axis("player").reset_index()
+
+
+def _played_at(adf, qdf):
+    # Tag der Runde: letzte Antwort, sonst letzte Frage, sonst heute (UTC)
+    for df, col in ((adf, "timestamp"), (qdf, "created_at")):
+        if not df.empty and col in df.columns:
+            ts = df[col].dropna().astype(str)
+            if not ts.empty:
+                return ts.max()[:10]
+    return datetime.utcnow().date().isoformat()
+
+
+def materialize_round(storage, round_id):
+    # Beim Wechsel nach results (engine.Game.advance); erneutes Spielen ersetzt die Zeilen
+    round_id = int(round_id)
+    qdf, adf, rdf = (storage.load_df(t, round_id) for t in scoring.SCORE_TABLES)
+    summary = round_summary(qdf, adf, rdf, round_id)
+    storage.save_summary(TABLE, round_id, summary)
+    return summary
+
+
+def backfill(storage):
+    # Einmalig (Schema-Migration 3): alle schon abgeschlossenen Runden nachtragen
+    state = storage.load_state()
+    done = set(storage.load_summary(TABLE)["round_id"].astype(int))
+    for rid in storage.round_ids():
+        finished = rid < int(state.get("round_id", 0)) or (rid == state.get("round_id") and state.get("phase") == "results")
+        if finished and rid not in done:
+            materialize_round(storage, rid)
+
+
+def standings(storage, since=None, until=None, players=None):
+    # Saisonwertung über round_stats; since/until als "YYYY-MM-DD" (inklusive)
+    df = storage.load_summary(TABLE)
+    if since:
+        df = df[df["played_at"].astype(str) >= str(since)]
+    if until:
+        df = df[df["played_at"].astype(str) <= str(until)]
+    if players:
+        df = df[df["player"].astype(str).isin([str(p) for p in players])]
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNS)
+    g = df.assign(player=df["player"].astype(str)).groupby("player").agg(
+        rounds=("round_id", "nunique"), player_points=("player_points", "sum"),
+        author_points=("author_points", "sum"), total=("total", "sum"), answered=("answered", "sum"),
+        answered_correct=("answered_correct", "sum"), stars_sum=("stars_sum", "sum"), stars_count=("stars_count", "sum"))
+    out = pd.DataFrame({
+        "Name": g.index,
+        "Runden": g["rounds"].to_numpy(),
+        "Spielerpunkte": g["player_points"].to_numpy(),
+        "Autorenpunkte": g["author_points"].to_numpy(),
+        "Gesamt": g["total"].to_numpy(),
+        "Trefferquote": (g["answered_correct"] / g["answered"].where(g["answered"] > 0)).to_numpy(),
+        "Ø Sterne": (g["stars_sum"] / g["stars_count"].where(g["stars_count"] > 0)).to_numpy(),
+    })
+    return out.sort_values("Gesamt", ascending=False, kind="stable").reset_index(drop=True)
+
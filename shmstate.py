@@ -0,0 +1,116 @@
+# Gemeinsames State-Segment für mehrere Worker-Prozesse: die Kernfelder des States (Phase,
+# Runde, Fragenindex, Reihenfolge, sync_nonce, Zeitstempel) plus Versionszähler in einer Datei
+# fester Größe unter DATA_DIR (state.shm), per mmap in jeden Prozess eingeblendet. state.json
+# (bzw. SQLite) bleibt die dauerhafte Kopie und wird immer zuerst geschrieben.
+#
+# Storage.load_state liest die Kernfelder aus dem Segment und den Rest (Host, Auto-Weiter)
+# aus einer geparsten Kopie, die nur neu gelesen wird, wenn sich ihr Fingerabdruck (body_hash)
+# ändert – ein Phasenwechsel in einem anderen Worker kostet also kein Lesen von state.json.
+#
+# Konsistenz über eine Seqlock: ungerade = Schreiber aktiv. Leser lesen Sequenz, Felder,
+# Sequenz und wiederholen bei Abweichung. Schreiber sind über die State-Sperre serialisiert.
+import hashlib, json, mmap, os, struct
+
+MAGIC = b"QZS3"
+MAX_ORDER = 4096            # so viele Fragen-IDs passen ins Segment
+# magic, seq, version, body_hash, round_id, q_idx, sync_nonce, n_order, phase, phase_started_at, last_update
+HEADER = struct.Struct("<4sQQQIIII16s32s32s")
+ORDER_OFFSET = 128
+SIZE = ORDER_OFFSET + 4 * MAX_ORDER
+SEQ_OFFSET, VERSION_OFFSET = 4, 12
+READ_RETRIES = 100
+POLL_SEC = 0.02             # Takt beim Warten auf eine neue Version (Storage.wait_for_change)
+
+CORE_FIELDS = ("phase", "round_id", "current_q_idx", "question_order", "sync_nonce",
+               "phase_started_at", "last_update")
+
+
+def body_hash(state):
+    # Fingerabdruck aller Felder, die nicht im Segment stehen
+    body = {k: v for k, v in state.items() if k not in CORE_FIELDS}
+    digest = hashlib.blake2b(json.dumps(body, sort_keys=True).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _text(value, size):
+    # None -> leer; sonst ASCII plus Endmarke, damit "" von None unterscheidbar bleibt
+    if value is None:
+        return b""
+    raw = str(value).encode("ascii") + b"\x01"
+    if len(raw) > size:
+        raise ValueError(value)
+    return raw
+
+
+def _untext(raw):
+    raw = raw.rstrip(b"\0")
+    return raw[:-1].decode("ascii") if raw else None
+
+
+class StateSegment:
+    def __init__(self, path):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < SIZE:
+                os.ftruncate(fd, SIZE)  # neu: Nullen, Version 0
+            self._mm = mmap.mmap(fd, SIZE)
+        finally:
+            os.close(fd)
+        if self._mm[:4] != MAGIC:      # neu oder altes Layout: Version 0 = noch nie veröffentlicht
+            self._mm[:ORDER_OFFSET] = bytes(ORDER_OFFSET)
+            self._mm[:4] = MAGIC
+
+    def version(self):
+        return struct.unpack_from("<Q", self._mm, VERSION_OFFSET)[0]
+
+    def read(self):
+        # Konsistenter Schnappschuss der Kernfelder samt "version" und "body_hash"; None, solange
+        # nie veröffentlicht wurde, die Felder nicht ins Segment passten oder ein Schreiber
+        # mitten im Schreiben gestorben ist (dann gilt state.json)
+        mm = self._mm
+        for _ in range(READ_RETRIES):
+            seq = struct.unpack_from("<Q", mm, SEQ_OFFSET)[0]
+            if seq & 1:
+                continue
+            _, _, version, bhash, round_id, q_idx, nonce, n_order, phase, started, updated = HEADER.unpack_from(mm, 0)
+            if n_order > MAX_ORDER:
+                return None
+            order = memoryview(mm)[ORDER_OFFSET:ORDER_OFFSET + 4 * n_order].cast("I").tolist()
+            if struct.unpack_from("<Q", mm, SEQ_OFFSET)[0] != seq:
+                continue
+            if version == 0 or bhash == 0:
+                return None
+            return {"version": version, "body_hash": bhash, "round_id": round_id, "current_q_idx": q_idx,
+                    "sync_nonce": nonce, "phase": phase.rstrip(b"\0").decode("ascii"),
+                    "question_order": order, "phase_started_at": _untext(started), "last_update": _untext(updated)}
+        return None
+
+    def publish(self, state):
+        # Aufrufer hält die State-Sperre und hat state.json bereits geschrieben. Passt der State
+        # nicht ins Layout, wird nur die Version erhöht und body_hash 0 gesetzt: Leser nehmen
+        # dann state.json.
+        mm = self._mm
+        seq = struct.unpack_from("<Q", mm, SEQ_OFFSET)[0]
+        seq += 1 if seq & 1 else 0   # abgebrochener Schreiber: Sequenz wieder gerade machen
+        version = self.version() + 1
+        try:
+            order = [int(q) for q in state.get("question_order") or []]
+            if len(order) > MAX_ORDER:
+                raise ValueError(len(order))
+            phase = str(state.get("phase") or "").encode("ascii")
+            if len(phase) > 16:
+                raise ValueError(phase)
+            header = HEADER.pack(MAGIC, seq + 1, version, body_hash(state) or 1,
+                                 int(state.get("round_id") or 0), int(state.get("current_q_idx") or 0),
+                                 int(state.get("sync_nonce") or 0), len(order), phase,
+                                 _text(state.get("phase_started_at"), 32), _text(state.get("last_update"), 32))
+            body = struct.pack(f"<{len(order)}I", *order)
+        except (TypeError, ValueError, struct.error):
+            header = HEADER.pack(MAGIC, seq + 1, version, 0, 0, 0, 0, 0, b"", b"", b"")
+            body = b""
+        struct.pack_into("<Q", mm, SEQ_OFFSET, seq + 1)
+        mm[:HEADER.size] = header
+        mm[ORDER_OFFSET:ORDER_OFFSET + len(body)] = body
+        struct.pack_into("<Q", mm, SEQ_OFFSET, seq + 2)
+        return version
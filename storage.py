@@ -0,0 +1,1053 @@
+# Speicher-Backends für Quiz Night: CSV-Dateien (Standard) oder SQLite im WAL-Modus.
+# Zugriff läuft über engine.Game (app.py ist nur die Ansicht darüber): load_df/save_df/submit/
+# exists_row/load_state/save_state, dazu Archiv, Deck und Saison-Zusammenfassungen.
+#
+# Daten sind nach Runden partitioniert: der Hot Path liest nur die laufende Runde
+# (CSV: rounds/<id>/<tabelle>.csv). Abgeschlossene Runden landen als Parquet unter
+# archive/round-<id>/ und werden nur bei Historien-Abfragen gelesen.
+import os, sys, csv, copy, json, shutil, sqlite3, threading, time
+from abc import ABC, abstractmethod
+import pandas as pd
+import profiling
+import shmstate
+from fsutil import write_atomic, log as _log
+
+try:
+    import fcntl
+except ImportError:  # Windows: nur prozessinterne Sperre
+    fcntl = None
+
+try:
+    import pyarrow  # noqa: F401  (Parquet-Archiv; kommt mit streamlit)
+    ARCHIVE_EXT = ".parquet"
+except ImportError:
+    ARCHIVE_EXT = ".csv.gz"
+ARCHIVE_EXTS = (".parquet", ".csv.gz")  # Leser prüfen beide: Parquet fällt bei gemischten Typen auf CSV zurück
+
+SCHEMAS = {
+    "questions": ["id","round_id","author","question","correct","wrong1","wrong2","wrong3","difficulty","created_at","media","pack"],
+    "answers": ["timestamp","round_id","player","question_id","answer","is_correct"],
+    "ratings": ["timestamp","round_id","player","question_id","stars"],
+    "players": ["round_id","player","joined_at","last_seen","phase"],
+}
+INT_COLUMNS = {"id", "round_id", "question_id", "stars", "answered", "answered_correct", "authored", "stars_count"}
+BOOL_COLUMNS = {"is_correct"}
+REAL_COLUMNS = {"player_points", "author_points", "total", "stars_sum"}
+
+# Materialisierte Zusammenfassungen: klein, eine Tabelle über alle Runden (nicht partitioniert),
+# pro Runde beim Erreichen der Ergebnisse ersetzt (siehe season.py)
+SUMMARY_SCHEMAS = {
+    "round_stats": ["round_id", "player", "played_at", "player_points", "author_points", "total",
+                    "answered", "answered_correct", "authored", "stars_sum", "stars_count"],
+}
+
+# Schlüssel für "schon eingereicht?"
+KEYS = {
+    "questions": ["round_id", "author"],
+    "answers": ["round_id", "player", "question_id"],
+    "ratings": ["round_id", "player", "question_id"],
+    "players": ["round_id", "player"],
+}
+# Dedupe-Schlüssel beim Kompaktieren/Archivieren: wie KEYS, nur dürfen importierte
+# Fragenpakete viele Fragen desselben Autors in einer Runde haben
+DEDUPE_KEYS = dict(KEYS, questions=["round_id", "author", "question"])
+APPEND_TABLES = ("questions", "answers", "ratings")
+
+COMPACT_EVERY_SEC = 30
+
+# Schema-Migrationen: (Version, Beschreibung, Methode). Jede läuft pro Datenverzeichnis genau
+# einmal; die erreichte Version steht in schema.json (CSV) bzw. PRAGMA user_version (SQLite).
+# Neue Spalten: in SCHEMAS eintragen und eine weitere Stufe mit _migrate_columns anhängen.
+MIGRATIONS = [
+    (1, "flache Tabellen -> Runden-Partitionen", "_migrate_split_flat"),
+    (2, "fehlende Spalten ergänzen (players.phase)", "_migrate_columns"),
+    (3, "Saison-Statistik abgeschlossener Runden nachtragen", "_migrate_round_stats"),
+    (4, "fehlende Spalten ergänzen (questions.media)", "_migrate_columns"),
+    (5, "Spalte questions.pack ergänzen und frühere Paket-Importe markieren", "_migrate_pack_column"),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+class FileLock:
+    # Schreibsperre über Prozesse (flock auf <name>.lock) und Threads (RLock).
+    # Reentrant pro Thread; Leser nehmen sie nie – sie sehen dank os.replace immer
+    # eine vollständige Datei.
+    def __init__(self, path):
+        self.path = path
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._fh = None
+
+    def __enter__(self):
+        self._rlock.acquire()
+        if self._depth == 0:
+            self._fh = open(self.path, "a")
+            if fcntl is not None:
+                fcntl.flock(self._fh, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._fh, fcntl.LOCK_UN)
+            self._fh.close()
+            self._fh = None
+        self._rlock.release()
+
+
+def partition_name(table, round_id):
+    return f"{table}@{int(round_id)}"
+
+def empty_df(table):
+    return pd.DataFrame(columns=SCHEMAS[table])
+
+
+class Storage(ABC):
+    name = "base"
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        # Prozessweiter Cache (alle Streamlit-Sessions teilen sich das Storage-Objekt):
+        # name -> (stamp, geparster Wert). Geparst wird nur, wenn sich der Stempel ändert.
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._writes = {}
+        self._members = {}  # Partition -> (stamp, Menge der Einreichungs-Schlüssel)
+        self.stats = {"hits": 0, "misses": 0}
+        # Änderungs-Benachrichtigung für wartende Sessions (statt Polling per Rerun)
+        self._changed = threading.Condition()
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self.writer = None  # WriteBehind, von open_storage gesetzt
+        self._segment = None  # StateSegment (state.shm), beim ersten Zugriff eingeblendet
+        self._state_body = None  # (Fingerabdruck, zuletzt geparster State) für load_state
+        self._threads = []    # Hintergrund-Threads (Archiv, Kompaktierung), von close() abgewartet
+        self._closing = threading.Event()
+
+    def append_row(self, row, table):
+        self.append_rows([row], table)
+
+    # ---------- Backend-Schnittstelle (CsvStorage / SqliteStorage) ----------
+    @abstractmethod
+    def ensure(self, init_state): ...
+    @abstractmethod
+    def _schema_version(self): ...
+    @abstractmethod
+    def _set_schema_version(self, version): ...
+    @abstractmethod
+    def save_df(self, df, table, round_id=None): ...
+    @abstractmethod
+    def append_rows(self, rows, table): ...
+    @abstractmethod
+    def save_state(self, state): ...
+    @abstractmethod
+    def _read_live(self, table, round_id): ...
+    @abstractmethod
+    def _has_live(self, table, round_id): ...
+    @abstractmethod
+    def _drop_live(self, table, round_id): ...
+    @abstractmethod
+    def _live_round_ids(self): ...
+    @abstractmethod
+    def _read_state(self): ...
+    @abstractmethod
+    def _read_deck(self, round_id): ...
+    @abstractmethod
+    def _write_deck(self, round_id, body): ...
+    @abstractmethod
+    def _read_summary(self, table): ...
+    @abstractmethod
+    def save_summary(self, table, round_id, df): ...
+    @abstractmethod
+    def _stamp(self, name): ...
+
+    # ---------- Bootstrap & Migrationen ----------
+    def bootstrap(self, init_state):
+        # Einmal pro Prozess (engine.Game.ensure), nicht pro Rerun: anlegen, dann
+        # ausstehende Migrationen; Ergebnis und Dauer gehen ins Server-Log.
+        t0 = time.perf_counter()
+        self.ensure(init_state)
+        applied = self.migrate()
+        seg = self.segment()
+        if seg is not None and seg.version() == 0:
+            with self.locked("state"):
+                if seg.version() == 0:
+                    seg.publish(self._read_state())
+        ms = (time.perf_counter() - t0) * 1000
+        for version, desc, step_ms in applied:
+            _log(f"{self.data_dir}: Migration {version} ({desc}) in {step_ms:.1f} ms")
+        _log(f"{self.data_dir}: Schema v{SCHEMA_VERSION} ({self.name}), Bootstrap {ms:.1f} ms, "
+             f"{len(applied)} Migration(en) angewendet")
+        return applied
+
+    def migrate(self):
+        applied = []
+        with self.locked("schema"):  # zwei Prozesse starten gleichzeitig -> einer migriert
+            current = self._schema_version()
+            for version, desc, method in MIGRATIONS:
+                if version <= current:
+                    continue
+                t0 = time.perf_counter()
+                getattr(self, method)()
+                self._set_schema_version(version)
+                applied.append((version, desc, (time.perf_counter() - t0) * 1000))
+        return applied
+
+    def _migrate_split_flat(self):
+        pass
+
+    def _migrate_columns(self):
+        pass
+
+    def _migrate_round_stats(self):
+        import season
+        season.backfill(self)
+
+    def _migrate_pack_column(self):
+        # Frühere Importe erkennt man nur am 📦-Autor; archivierte Runden behalten ihre
+        # gespeicherte Saisonwertung und bleiben unverändert
+        from packs import PACK_PREFIX
+        self._migrate_columns()
+        for rid in self._live_round_ids():
+            with self.locked("questions"):
+                if not self._has_live("questions", rid):
+                    continue
+                df = self._read_live("questions", rid)
+                df["pack"] = df["pack"].astype(object).where(df["pack"].notna(), "")
+                mask = df["author"].astype(str).str.startswith(PACK_PREFIX) & (df["pack"].astype(str) == "")
+                if mask.any():
+                    df.loc[mask, "pack"] = df.loc[mask, "author"].astype(str).str[len(PACK_PREFIX):]
+                    self.save_df(df, "questions", rid)
+
+    def load_df(self, table, round_id=None):
+        # Mit round_id: nur diese Partition (Hot Path). Ohne: gesamte Historie,
+        # Runde für Runde (Archive werden erst hier gelesen).
+        if round_id is None:
+            parts = [self.load_df(table, rid) for rid in self.round_ids()]
+            parts = [p for p in parts if not p.empty]
+            return pd.concat(parts, ignore_index=True) if parts else empty_df(table)
+        name = partition_name(table, round_id)
+        if self.writer is not None and self.writer.has_pending(name):
+            self.writer.flush()  # Lesen-was-man-schreibt
+        return self._cached(name, lambda: self._read_round(table, int(round_id))).copy()
+
+    def load_state(self):
+        # Kernfelder (Phase, Runde, Fragenindex, Reihenfolge, …) direkt aus dem State-Segment;
+        # den Rest nur neu parsen, wenn sich sein Fingerabdruck geändert hat (shmstate.py)
+        seg = self.segment()
+        core = seg.read() if seg is not None else None
+        if core is None:
+            return copy.deepcopy(self._cached("state", self._read_state))
+        body = self._state_body
+        if body is None or body[0] != core["body_hash"]:
+            parsed = self._read_state()
+            profiling.note_parse(1)
+            body = self._state_body = (shmstate.body_hash(parsed), parsed)
+            with self._cache_lock:
+                self.stats["misses"] += 1
+        else:
+            with self._cache_lock:
+                self.stats["hits"] += 1
+        state = copy.deepcopy(body[1])
+        state.update((k, core[k]) for k in shmstate.CORE_FIELDS)
+        return state
+
+    def load_summary(self, table):
+        return self._cached(table, lambda: self._read_summary(table)).copy()
+
+    # ---------- Geteiltes State-Segment ----------
+    # Kernfelder und Versionszähler des States per mmap für alle Prozesse (siehe shmstate.py).
+    # Der Cache-Stempel des States ist diese Version: ein Speicherzugriff statt stat/SELECT.
+    def segment(self):
+        if self._segment is None:
+            try:
+                self._segment = shmstate.StateSegment(os.path.join(self.data_dir, "state.shm"))
+            except (OSError, ValueError):
+                return None
+        return self._segment
+
+    def _publish_state(self, state):
+        # unter der State-Sperre, nachdem die dauerhafte Kopie geschrieben ist
+        seg = self.segment()
+        if seg is not None:
+            seg.publish(state)
+
+    def _segment_stamp(self):
+        seg = self.segment()
+        if seg is None:
+            return None
+        version = seg.version()
+        return ("shm", version) if version else None
+
+    # ---------- Runden-Deck ----------
+    # Beim Start der Antwort-Phase einmal eingefroren (siehe deck.py); danach nur noch
+    # gelesen und nie verändert -> wird ohne Kopie aus dem Cache ausgeliefert.
+    def save_deck(self, round_id, cards):
+        self._write_deck(int(round_id), json.dumps(list(cards), ensure_ascii=False))
+
+    def load_deck(self, round_id):
+        def read():
+            body = self._read_deck(int(round_id))
+            return tuple(json.loads(body)) if body else ()
+        return self._cached(partition_name("deck", round_id), read)
+
+    def exists_row(self, table, **where):
+        # Genau der Einreichungs-Schlüssel gefragt -> O(1) über den Mitgliedschafts-Index
+        keys = KEYS.get(table)
+        if keys and "round_id" in where and set(where) == set(keys):
+            key = member_key(where[k] for k in keys)
+            if self.writer is not None and self.writer.pending_key(table, key):
+                return True  # eingereicht, nur noch nicht geschrieben
+            return self._exists_key(table, where, key)
+        df = self.load_df(table, where.get("round_id"))
+        if df.empty:
+            return False
+        mask = pd.Series(True, index=df.index)
+        for col, val in where.items():
+            mask &= df[col] == val
+        return bool(mask.any())
+
+    def _exists_key(self, table, where, key):
+        return key in self._member_set(table, where["round_id"])
+
+    # ---------- Einreichungen (write-behind) ----------
+    def submit(self, row, table):
+        # Im Request-Pfad nur einreihen; ohne Writer synchron schreiben
+        if self.writer is None:
+            self.append_row(row, table)
+        else:
+            self.writer.put(row, table)
+
+    def flush_writes(self):
+        return True if self.writer is None else self.writer.flush()
+
+    def write_stats(self):
+        return None if self.writer is None else dict(self.writer.stats)
+
+    # ---------- Mitgliedschafts-Index ----------
+    # Pro Partition die Menge der Schlüssel aus KEYS, geteilt von allen Sessions. Eigene
+    # Einreichungen werden direkt eingetragen; ändert sich die Partition anders (anderer
+    # Prozess, Kompaktierung, Archiv), wird sie beim nächsten Zugriff neu eingelesen.
+    def _member_stamp(self, name):
+        return (self._writes.get(name, 0), self._stamp(name))
+
+    def _member_set(self, table, round_id):
+        name = partition_name(table, round_id)
+        stamp = self._member_stamp(name)
+        with self._cache_lock:
+            hit = self._members.get(name)
+            if hit is not None and hit[0] == stamp:
+                return hit[1]
+        df = self.load_df(table, round_id)
+        members = set() if df.empty else set(zip(*(df[c].map(_member_part) for c in KEYS[table])))
+        with self._cache_lock:
+            self._members[name] = (stamp, members)
+        return members
+
+    def _note_members(self, table, round_id, rows, before):
+        # Nur eintragen, wenn der Index genau den Stand vor dem Schreiben kannte
+        # (Aufrufer hält die Tabellen-Sperre, andere Schreiber sind ausgeschlossen)
+        name = partition_name(table, round_id)
+        after = self._member_stamp(name)
+        with self._cache_lock:
+            hit = self._members.get(name)
+            if hit is not None and hit[0] == before:
+                hit[1].update(member_key(row[k] for k in KEYS[table]) for row in rows)
+                self._members[name] = (after, hit[1])
+
+    def round_ids(self):
+        return sorted(set(self._live_round_ids()) | set(self._archived_round_ids()))
+
+    def next_id(self, table, n=1):
+        # Fortlaufende IDs über alle Runden (Partitionen kennen das Maximum nicht);
+        # n > 1 reserviert einen Block und gibt dessen erste ID zurück
+        path = os.path.join(self.data_dir, f"{table}.seq")
+        with self.locked(f"{table}.seq"):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    cur = int(f.read().strip())
+            except (FileNotFoundError, ValueError):
+                df = self.load_df(table)
+                cur = int(df["id"].max()) if not df.empty else 0
+            write_atomic(path, lambda f: f.write(str(cur + n)))
+        return cur + 1
+
+    def iter_rows(self, table, round_ids=None):
+        # Zeile für Zeile, Runde für Runde, am Cache vorbei: im Speicher liegt höchstens
+        # eine Runde, egal wie lang die Historie ist
+        if self.writer is not None:
+            self.writer.flush()
+        for rid in (self.round_ids() if round_ids is None else round_ids):
+            df = self._read_round(table, int(rid))
+            for row in df.to_dict("records"):
+                yield row
+
+    def compact(self, table, round_id):
+        return False
+
+    # ---------- Archiv abgeschlossener Runden ----------
+    def archive_dir(self, round_id):
+        return os.path.join(self.data_dir, "archive", f"round-{int(round_id)}")
+
+    def archive_path(self, table, round_id):
+        # Vorhandene Archivdatei der Tabelle (Parquet oder .csv.gz), sonst None
+        for ext in ARCHIVE_EXTS:
+            path = os.path.join(self.archive_dir(round_id), f"{table}{ext}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def archive_round(self, round_id, drop_live=False):
+        # Runde dedupliziert als Parquet ablegen; drop_live erst, wenn die Runde
+        # nicht mehr gespielt wird (neue Runde), damit Leser nie eine Lücke sehen.
+        # Vorher die Schreib-Queue leeren: sonst fehlen wartende Einreichungen im Archiv
+        # und legen nach drop_live eine neue Live-Partition an, die das Archiv verdeckt.
+        self.flush_writes()
+        os.makedirs(self.archive_dir(round_id), exist_ok=True)
+        for table in SCHEMAS:
+            with self.locked(table):
+                if not self._has_live(table, round_id):
+                    continue
+                df = self._read_live(table, round_id)
+                keys = [k for k in DEDUPE_KEYS[table] if k in df.columns]
+                if keys:
+                    df = df.drop_duplicates(subset=keys, keep="first")
+                path = write_archive(df, os.path.join(self.archive_dir(round_id), f"{table}{ARCHIVE_EXT}"))
+                for ext in ARCHIVE_EXTS:   # älteres Archiv im anderen Format würde sonst gelesen
+                    other = os.path.join(self.archive_dir(round_id), f"{table}{ext}")
+                    if other != path and os.path.exists(other):
+                        os.remove(other)
+                if drop_live:
+                    # Live-Partition erst löschen, wenn das Archiv vollständig zurückgelesen wurde
+                    try:
+                        ok = len(read_archive(path)) == len(df)
+                    except Exception:
+                        ok = False
+                    if ok:
+                        self._drop_live(table, round_id)
+                    else:
+                        _log(f"{self.data_dir}: Archiv {path} unvollständig, Live-Daten bleiben")
+            self._bump(partition_name(table, round_id))
+
+    def schedule_archive(self, round_id, drop_live=False):
+        # Abseits des Request-Pfads
+        self._start_thread(self.archive_round, (round_id, drop_live), f"quiz-archive:{round_id}")
+
+    def _start_thread(self, target, args, name):
+        t = threading.Thread(target=target, args=args, name=name, daemon=True)
+        with self._locks_guard:
+            self._threads = [x for x in self._threads if x.is_alive()] + [t]
+        t.start()
+        return t
+
+    def close(self):
+        # Hintergrund-Arbeit beenden (engine.Game.close): Schreib-Queue leeren, laufende
+        # Archivierung und Kompaktierung abwarten, aus der Registry von open_storage nehmen
+        self._closing.set()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        with self._locks_guard:
+            threads = list(self._threads)
+        for t in threads:
+            t.join()
+        with _lock:
+            for key in [k for k, v in _storages.items() if v is self]:
+                del _storages[key]
+
+    def _archived_round_ids(self):
+        base = os.path.join(self.data_dir, "archive")
+        if not os.path.isdir(base):
+            return []
+        return [int(n.split("-", 1)[1]) for n in os.listdir(base) if n.startswith("round-")]
+
+    def _read_round(self, table, round_id):
+        if self._has_live(table, round_id):
+            return self._read_live(table, round_id)
+        path = self.archive_path(table, round_id)
+        if path is not None:
+            return read_archive(path)
+        return empty_df(table)
+
+    def _archive_stamp(self, name):
+        if "@" not in name:
+            return None
+        table, rid = name.split("@", 1)
+        try:
+            st_ = os.stat(self.archive_path(table, rid) or "")
+        except FileNotFoundError:
+            return None
+        return (st_.st_ino, st_.st_mtime_ns, st_.st_size)
+
+    def locked(self, name):
+        # Für Lesen-Ändern-Schreiben: with STORAGE.locked("state"): ...
+        with self._locks_guard:
+            lock = self._locks.get(name)
+            if lock is None:
+                lock = self._locks[name] = FileLock(os.path.join(self.data_dir, f"{name}.lock"))
+            return lock
+
+    def cache_stats(self):
+        with self._cache_lock:
+            return dict(self.stats)
+
+    def change_token(self, names):
+        return tuple((self._writes.get(n, 0), self._stamp(n)) for n in names)
+
+    def wait_for_change(self, token, names, timeout):
+        # Blockiert, bis sich eine der Tabellen / der State ändert (oder timeout).
+        # Schreibzugriffe dieses Prozesses wecken sofort; andere Prozesse fallen
+        # beim abschließenden Stempel-Vergleich auf.
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                if self.change_token(names) != token:
+                    return True
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                if "state" in names and self._segment is not None:
+                    left = min(left, shmstate.POLL_SEC)  # andere Worker: Versionszähler im Segment
+                self._changed.wait(left)
+
+    def touch(self, name):
+        # Änderung ohne Datei (z. B. Präsenz im Speicher) an wartende Sessions melden
+        self._bump(name)
+
+    def _bump(self, *names):
+        # Eigene Schreibzugriffe zählen mit, falls mtime/size (grobe Auflösung) gleich bleiben
+        with self._cache_lock:
+            for name in names:
+                self._writes[name] = self._writes.get(name, 0) + 1
+        with self._changed:
+            self._changed.notify_all()
+
+    def _cached(self, name, load):
+        stamp = (self._writes.get(name, 0), self._stamp(name))
+        with self._cache_lock:
+            hit = self._cache.get(name)
+            if hit is not None and hit[0] == stamp:
+                self.stats["hits"] += 1
+                return hit[1]
+        value = load()
+        profiling.note_parse(len(value) if isinstance(value, pd.DataFrame) else 1)
+        with self._cache_lock:
+            self.stats["misses"] += 1
+            self._cache[name] = (stamp, value)
+        return value
+
+
+def _member_part(v):
+    # CSV liest "7" als 7, Spielernamen aus Ziffern als int -> einheitlich als Text
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return str(v)
+
+def member_key(values):
+    return tuple(_member_part(v) for v in values)
+
+
+def write_archive(df, path):
+    # Gibt den tatsächlich geschriebenen Pfad zurück
+    if path.endswith(".parquet"):
+        try:
+            write_atomic(path, lambda f: df.to_parquet(f, index=False), mode="wb")
+            return path
+        except Exception:
+            # gemischte Typen o. Ä. -> komprimiertes CSV daneben
+            path = path[: -len(".parquet")] + ".csv.gz"
+    write_atomic(path, lambda f: df.to_csv(f, index=False, compression="gzip"), mode="wb")
+    return path
+
+def read_archive(path):
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return read_csv(path, compression="gzip")
+
+def read_csv(path, **kwargs):
+    # Nur leere Felder sind NaN: "n/a" (Schwierigkeit), "NA", "null" usw. bleiben Text
+    return pd.read_csv(path, keep_default_na=False, na_values=[""], **kwargs)
+
+
+# ---------- CSV ----------
+class CsvStorage(Storage):
+    name = "csv"
+
+    def round_dir(self, round_id):
+        return os.path.join(self.data_dir, "rounds", str(int(round_id)))
+
+    def path(self, table, round_id):
+        return os.path.join(self.round_dir(round_id), f"{table}.csv")
+
+    def deck_path(self, round_id):
+        return os.path.join(self.round_dir(round_id), "deck.json")
+
+    @property
+    def state_path(self):
+        return os.path.join(self.data_dir, "state.json")
+
+    def ensure(self, init_state):
+        os.makedirs(os.path.join(self.data_dir, "rounds"), exist_ok=True)
+        if not os.path.exists(self.state_path):
+            with self.locked("state"):
+                if not os.path.exists(self.state_path):
+                    write_atomic(self.state_path, lambda f: json.dump(init_state, f))
+
+    def _schema_version(self):
+        try:
+            with open(os.path.join(self.data_dir, "schema.json"), "r", encoding="utf-8") as f:
+                return int(json.load(f)["version"])
+        except (FileNotFoundError, ValueError, KeyError):
+            return 0
+
+    def _set_schema_version(self, version):
+        write_atomic(os.path.join(self.data_dir, "schema.json"), lambda f: json.dump({"version": version}, f))
+
+    def _migrate_split_flat(self):
+        for table in SCHEMAS:
+            flat = os.path.join(self.data_dir, f"{table}.csv")
+            if os.path.exists(flat):
+                self._split_flat(table, flat)
+
+    def _split_flat(self, table, flat):
+        # Eine Datei mit allen Runden -> rounds/<id>/<tabelle>.csv
+        with self.locked(table):
+            if not os.path.exists(flat):
+                return
+            df = read_csv(flat)
+            for rid, part in df.groupby("round_id"):
+                if self._has_live(table, rid):
+                    part = pd.concat([self._read_live(table, rid), part], ignore_index=True)
+                self.save_df(part, table, rid)
+            os.remove(flat)
+
+    def _migrate_columns(self):
+        # Nur die Kopfzeile lesen; geparst und neu geschrieben wird nur, wo Spalten fehlen
+        for rid in self._live_round_ids():
+            for table, cols in SCHEMAS.items():
+                path = self.path(table, rid)
+                if not os.path.exists(path):
+                    continue
+                with open(path, "r", encoding="utf-8", newline="") as f:
+                    header = next(csv.reader(f), [])
+                missing = [c for c in cols if c not in header]
+                if not missing:
+                    continue
+                with self.locked(table):
+                    df = read_csv(path)
+                    for col in missing:
+                        df[col] = ""
+                    df = df[cols + [c for c in df.columns if c not in cols]]
+                    write_atomic(path, lambda f: df.to_csv(f, index=False))
+                self._bump(partition_name(table, rid), table)
+
+    def _stamp(self, name):
+        if name == "state":
+            stamp = self._segment_stamp()
+            if stamp is not None:
+                return stamp
+            path = self.state_path
+        elif name in SUMMARY_SCHEMAS:
+            path = self.summary_path(name)
+        elif name.startswith("deck@"):
+            path = self.deck_path(name.split("@", 1)[1])
+        elif "@" in name:
+            table, rid = name.split("@", 1)
+            path = self.path(table, rid)
+        else:
+            return None
+        try:
+            st_ = os.stat(path)
+            live = (st_.st_ino, st_.st_mtime_ns, st_.st_size)
+        except FileNotFoundError:
+            live = None
+        return (live, self._archive_stamp(name))
+
+    def _has_live(self, table, round_id):
+        return os.path.exists(self.path(table, round_id))
+
+    def _read_live(self, table, round_id):
+        return read_csv(self.path(table, round_id))
+
+    def _drop_live(self, table, round_id):
+        os.remove(self.path(table, round_id))
+        rdir = self.round_dir(round_id)
+        if not any(n.endswith(".csv") for n in os.listdir(rdir)):
+            shutil.rmtree(rdir, ignore_errors=True)
+
+    def _live_round_ids(self):
+        base = os.path.join(self.data_dir, "rounds")
+        if not os.path.isdir(base):
+            return []
+        return [int(n) for n in os.listdir(base) if n.isdigit()]
+
+    def save_df(self, df, table, round_id=None):
+        if round_id is None:
+            for rid, part in df.groupby("round_id"):
+                self.save_df(part, table, rid)
+            return
+        with self.locked(table):
+            os.makedirs(self.round_dir(round_id), exist_ok=True)
+            write_atomic(self.path(table, round_id), lambda f: df.to_csv(f, index=False))
+        self._bump(partition_name(table, round_id), table)
+
+    def append_rows(self, rows, table):
+        # Einreichungen = Zeilen am Ende der Partition ihrer Runde; kein Neuschreiben,
+        # ein fsync pro Runde und Batch
+        by_round = {}
+        for row in rows:
+            by_round.setdefault(int(row["round_id"]), []).append(row)
+        for rid, part in by_round.items():
+            self._append_round(part, table, rid)
+
+    def _append_round(self, rows, table, rid):
+        path = self.path(table, rid)
+        name = partition_name(table, rid)
+        with self.locked(table):
+            before = self._member_stamp(name)
+            header, needs_nl = None, False
+            if os.path.exists(path):
+                with open(path, "rb") as fb:
+                    first = fb.readline().decode("utf-8").strip()
+                    header = next(csv.reader([first]), None) if first else None
+                    if fb.seek(0, os.SEEK_END) > 0:
+                        fb.seek(-1, os.SEEK_END)
+                        needs_nl = fb.read(1) != b"\n"
+            else:
+                os.makedirs(self.round_dir(rid), exist_ok=True)
+            with open(path, "a", encoding="utf-8", newline="") as f:
+                if not header:
+                    header = SCHEMAS.get(table) or list(rows[0].keys())
+                    f.write(",".join(header) + "\n")
+                elif needs_nl:
+                    f.write("\n")
+                csv.writer(f, lineterminator="\n").writerows([row.get(c, "") for c in header] for row in rows)
+                f.flush()
+                os.fsync(f.fileno())
+            self._bump(name, table)
+            if table in KEYS:
+                self._note_members(table, rid, rows, before)
+
+    def _read_state(self):
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_state(self, state):
+        with self.locked("state"):
+            write_atomic(self.state_path, lambda f: json.dump(state, f))
+            self._publish_state(state)
+        self._bump("state")
+
+    def _read_deck(self, round_id):
+        try:
+            with open(self.deck_path(round_id), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_deck(self, round_id, body):
+        os.makedirs(self.round_dir(round_id), exist_ok=True)
+        write_atomic(self.deck_path(round_id), lambda f: f.write(body))
+        self._bump(partition_name("deck", round_id))
+
+    def summary_path(self, table):
+        return os.path.join(self.data_dir, f"{table}.csv")
+
+    def _read_summary(self, table):
+        path = self.summary_path(table)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=SUMMARY_SCHEMAS[table])
+        return read_csv(path)
+
+    def save_summary(self, table, round_id, df):
+        # Zeilen der Runde ersetzen; der Rest bleibt, wie er ist
+        cols = SUMMARY_SCHEMAS[table]
+        with self.locked(table):
+            cur = self._read_summary(table)
+            cur = cur[cur["round_id"].astype(int) != int(round_id)] if not cur.empty else cur
+            parts = [p for p in (cur, df[cols]) if not p.empty]
+            out = pd.concat(parts, ignore_index=True).sort_values("round_id", kind="stable") if parts else df[cols]
+            write_atomic(self.summary_path(table), lambda f: out.to_csv(f, index=False))
+        self._bump(table)
+
+    def compact(self, table, round_id):
+        # Doppelte Einreichungen (z. B. zwei Tabs) entfernen; läuft nur im Hintergrund
+        path, keys = self.path(table, round_id), DEDUPE_KEYS[table]
+        if not os.path.exists(path):
+            return False
+        with self.locked(table):  # Appends warten kurz, landen dann in der neuen Datei
+            df = read_csv(path)
+            if df.empty or not set(keys) <= set(df.columns):
+                return False
+            compacted = df.drop_duplicates(subset=keys, keep="first")
+            if len(compacted) == len(df):
+                return False
+            write_atomic(path, lambda f: compacted.to_csv(f, index=False))
+        self._bump(partition_name(table, round_id), table)
+        return True
+
+
+# ---------- SQLite (WAL) ----------
+class SqliteStorage(Storage):
+    name = "sqlite"
+
+    def __init__(self, data_dir, db_path=None):
+        super().__init__(data_dir)
+        self.db_path = db_path or os.path.join(data_dir, "quiz.db")
+        self._local = threading.local()
+
+    def conn(self):
+        # Eine Verbindung pro Thread (jede Streamlit-Session läuft in eigenem Thread)
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = c
+        return c
+
+    def close(self):
+        super().close()
+        c = getattr(self._local, "conn", None)  # Verbindungen anderer Threads enden mit ihnen
+        if c is not None:
+            c.close()
+            self._local.conn = None
+
+    def ensure(self, init_state):
+        os.makedirs(self.data_dir, exist_ok=True)
+        c = self.conn()
+        for table, cols in SCHEMAS.items():
+            decl = ", ".join(f"{col} {_sql_type(col)}" for col in cols)
+            c.execute(f"CREATE TABLE IF NOT EXISTS {table} ({decl})")
+        c.execute("CREATE INDEX IF NOT EXISTS ix_answers_key ON answers(round_id, player, question_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS ix_ratings_key ON ratings(round_id, player, question_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS ix_questions_key ON questions(round_id, author)")
+        c.execute("CREATE INDEX IF NOT EXISTS ix_players_key ON players(round_id, player)")
+        c.execute("CREATE TABLE IF NOT EXISTS state (id INTEGER PRIMARY KEY CHECK (id = 1), body TEXT NOT NULL)")
+        c.execute("INSERT OR IGNORE INTO state (id, body) VALUES (1, ?)", (json.dumps(init_state),))
+        c.execute("CREATE TABLE IF NOT EXISTS decks (round_id INTEGER PRIMARY KEY, body TEXT NOT NULL)")
+        for table, cols in SUMMARY_SCHEMAS.items():
+            c.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(f'{col} {_sql_type(col)}' for col in cols)})")
+            c.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_round ON {table}(round_id)")
+        # Versionszähler pro Tabelle/Runde, im selben Commit wie die Änderung erhöht (Cache-Stempel)
+        c.execute("CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, v INTEGER NOT NULL)")
+        c.execute("INSERT OR IGNORE INTO versions (name, v) VALUES ('state', 0)")
+
+    def _schema_version(self):
+        return self.conn().execute("PRAGMA user_version").fetchone()[0]
+
+    def _set_schema_version(self, version):
+        self.conn().execute(f"PRAGMA user_version = {int(version)}")
+
+    def _migrate_columns(self):
+        c = self.conn()
+        for table, cols in SCHEMAS.items():
+            have = {r[1] for r in c.execute(f"PRAGMA table_info({table})")}
+            for col in cols:
+                if col not in have:
+                    c.execute(f"ALTER TABLE {table} ADD COLUMN {col} {_sql_type(col)}")
+
+    def _stamp(self, name):
+        if name == "state":
+            stamp = self._segment_stamp()
+            if stamp is not None:
+                return stamp
+        row = self.conn().execute("SELECT v FROM versions WHERE name = ?", (name,)).fetchone()
+        return (row[0] if row else None, self._archive_stamp(name))
+
+    def _write(self, names, sql, params=(), many=False, before=None):
+        c = self.conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            if before:
+                c.execute(*before)
+            (c.executemany if many else c.execute)(sql, params)
+            for name in names:
+                c.execute("INSERT OR IGNORE INTO versions (name, v) VALUES (?, 0)", (name,))
+                c.execute("UPDATE versions SET v = v + 1 WHERE name = ?", (name,))
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        self._bump(*names)
+
+    def _has_live(self, table, round_id):
+        return self.conn().execute(f"SELECT 1 FROM {table} WHERE round_id = ? LIMIT 1",
+                                   (int(round_id),)).fetchone() is not None
+
+    def _read_live(self, table, round_id):
+        cols = SCHEMAS[table]
+        df = pd.read_sql_query(f"SELECT {', '.join(cols)} FROM {table} WHERE round_id = ? ORDER BY rowid",
+                               self.conn(), params=(int(round_id),))
+        for col in BOOL_COLUMNS & set(cols):
+            df[col] = df[col].astype(bool)
+        return df
+
+    def _drop_live(self, table, round_id):
+        self._write([partition_name(table, round_id), table], f"DELETE FROM {table} WHERE round_id = ?", (int(round_id),))
+
+    def _live_round_ids(self):
+        c = self.conn()
+        ids = set()
+        for table in SCHEMAS:
+            ids.update(r[0] for r in c.execute(f"SELECT DISTINCT round_id FROM {table}"))
+        return [int(i) for i in ids if i is not None]
+
+    def save_df(self, df, table, round_id=None):
+        cols = [c for c in SCHEMAS[table] if c in df.columns]
+        rows = [tuple(_sql_value(r[c]) for c in cols) for r in df.to_dict("records")]
+        if round_id is None:
+            names = [table] + [partition_name(table, rid) for rid in df["round_id"].dropna().unique()]
+            before = (f"DELETE FROM {table}",)
+        else:
+            names = [table, partition_name(table, round_id)]
+            before = (f"DELETE FROM {table} WHERE round_id = ?", (int(round_id),))
+        self._write(names, f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                    rows, many=True, before=before)
+
+    def append_rows(self, rows, table):
+        # Ein Batch = eine Transaktion
+        cols = [c for c in SCHEMAS[table] if c in rows[0]]
+        names = [table] + sorted({partition_name(table, r["round_id"]) for r in rows})
+        self._write(names, f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                    [tuple(_sql_value(r.get(c)) for c in cols) for r in rows], many=True)
+
+    def _exists_key(self, table, where, key):
+        # Index-Abfrage statt Menge im Speicher
+        cond = " AND ".join(f"{col} = ?" for col in where)
+        cur = self.conn().execute(f"SELECT 1 FROM {table} WHERE {cond} LIMIT 1",
+                                  tuple(_sql_value(v) for v in where.values()))
+        return cur.fetchone() is not None
+
+    def _read_state(self):
+        return json.loads(self.conn().execute("SELECT body FROM state WHERE id = 1").fetchone()[0])
+
+    def save_state(self, state):
+        with self.locked("state"):
+            self._write(["state"], "UPDATE state SET body = ? WHERE id = 1", (json.dumps(state),))
+            self._publish_state(state)
+
+    def _read_deck(self, round_id):
+        row = self.conn().execute("SELECT body FROM decks WHERE round_id = ?", (round_id,)).fetchone()
+        return row[0] if row else None
+
+    def _write_deck(self, round_id, body):
+        self._write([partition_name("deck", round_id)],
+                    "INSERT OR REPLACE INTO decks (round_id, body) VALUES (?, ?)", (round_id, body))
+
+    def _read_summary(self, table):
+        cols = SUMMARY_SCHEMAS[table]
+        return pd.read_sql_query(f"SELECT {', '.join(cols)} FROM {table} ORDER BY round_id, rowid", self.conn())
+
+    def save_summary(self, table, round_id, df):
+        cols = SUMMARY_SCHEMAS[table]
+        rows = [tuple(_sql_value(r[c]) for c in cols) for r in df[cols].to_dict("records")]
+        self._write([table], f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                    rows, many=True, before=(f"DELETE FROM {table} WHERE round_id = ?", (int(round_id),)))
+
+
+def _sql_type(col):
+    if col in INT_COLUMNS or col in BOOL_COLUMNS:
+        return "INTEGER"
+    if col in REAL_COLUMNS:
+        return "REAL"
+    return "TEXT"
+
+def _sql_value(v):
+    if v is None or (isinstance(v, float) and v != v):
+        return None
+    if hasattr(v, "item"):  # numpy-Skalare
+        v = v.item()
+    if isinstance(v, bool):
+        return int(v)
+    return v
+
+
+# ---------- Migration: flaches data/ -> Standardraum ----------
+_adopt_checked = set()
+
+def adopt_legacy_layout(data_dir, room_dir):
+    # Vor den Räumen lag alles direkt in data/; einmalig in den Standardraum verschieben.
+    # Pro Prozess nur einmal geprüft (app.py ruft das bei jedem Rerun).
+    if room_dir in _adopt_checked:
+        return False
+    _adopt_checked.add(room_dir)
+    if not os.path.exists(os.path.join(data_dir, "state.json")) or os.path.exists(room_dir):
+        return False
+    try:
+        os.makedirs(room_dir)
+    except FileExistsError:  # andere Session war schneller
+        return False
+    for name in os.listdir(data_dir):
+        if name.endswith((".csv", ".json", ".lock")) or name.startswith("quiz.db"):
+            os.replace(os.path.join(data_dir, name), os.path.join(room_dir, name))
+    return True
+
+
+# ---------- Migration CSV -> SQLite ----------
+def migrate_csv_to_sqlite(data_dir, db_path=None):
+    # Einmalig: bestehende CSVs + state.json in eine leere Datenbank übernehmen.
+    # Archivierte Runden (archive/) teilen sich beide Backends und bleiben, wo sie sind.
+    src = CsvStorage(data_dir)
+    dst = SqliteStorage(data_dir, db_path)
+    fresh = not os.path.exists(dst.db_path)
+    if os.path.exists(src.state_path):
+        src.migrate()  # ggf. flache CSVs erst in Runden-Partitionen aufteilen
+    dst.ensure(src.load_state() if os.path.exists(src.state_path) else {})
+    if not fresh:
+        return dst
+    for rid in src._live_round_ids():
+        for table in SCHEMAS:
+            if src._has_live(table, rid):
+                dst.save_df(src._read_live(table, rid), table, rid)
+    return dst
+
+
+# ---------- Registry & Hintergrund-Kompaktierung ----------
+_storages = {}
+_lock = threading.Lock()
+
+def open_storage(data_dir, backend="csv"):
+    # app.py läuft bei jedem Rerun neu; Backends leben pro Prozess hier im Modul
+    key = (os.path.abspath(data_dir), backend)
+    with _lock:
+        if key not in _storages:
+            if backend == "sqlite":
+                db_path = os.path.join(data_dir, "quiz.db")
+                if not os.path.exists(db_path) and os.path.exists(os.path.join(data_dir, "state.json")):
+                    _storages[key] = migrate_csv_to_sqlite(data_dir, db_path)
+                else:
+                    _storages[key] = SqliteStorage(data_dir, db_path)
+            else:
+                _storages[key] = CsvStorage(data_dir)
+                _start_compactor(_storages[key])
+            from writebehind import WriteBehind
+            _storages[key].writer = WriteBehind(_storages[key])
+        return _storages[key]
+
+def _start_compactor(storage):
+    def loop():
+        seen = {}
+        while not storage._closing.wait(COMPACT_EVERY_SEC):
+            for rid in storage._live_round_ids():
+                for table in APPEND_TABLES:
+                    try:
+                        size = os.path.getsize(storage.path(table, rid))
+                        if seen.get((table, rid)) == size:
+                            continue
+                        storage.compact(table, rid)
+                        seen[(table, rid)] = os.path.getsize(storage.path(table, rid))
+                    except Exception:
+                        pass
+    storage._start_thread(loop, (), f"quiz-compactor:{storage.data_dir}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        target = sys.argv[2] if len(sys.argv) > 2 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "MAIN")
+        st_ = migrate_csv_to_sqlite(target)
+        print(f"Migriert nach {st_.db_path}")
+    else:
+        print("Usage: python storage.py migrate [DATA_DIR]")
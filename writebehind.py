@@ -0,0 +1,107 @@
+# Write-behind für Einreichungen: der Script-Thread legt Antworten/Bewertungen/Fragen nur in
+# eine Queue; ein Hintergrund-Thread sammelt sie einige Millisekunden und schreibt sie als
+# ein Batch-Append pro Tabelle. Lesen-was-man-schreibt: exists_row sieht wartende Schlüssel,
+# load_df einer Partition mit wartenden Zeilen flusht vorher.
+import threading, time
+from collections import Counter
+from storage import KEYS, member_key, partition_name
+
+FLUSH_DELAY_SEC = 0.005     # so lange werden Einreichungen gesammelt
+RETRY_SEC = 0.2             # nach einem Schreibfehler
+FLUSH_TIMEOUT_SEC = 10.0
+
+
+class WriteBehind:
+    def __init__(self, storage, delay=FLUSH_DELAY_SEC):
+        self.storage = storage
+        self.delay = delay
+        self._cond = threading.Condition()
+        self._queue = []            # (enqueued_at, table, row)
+        self._enqueued = 0
+        self._flushed = 0
+        self._keys = set()          # (table, Schlüssel) noch nicht geschrieben
+        self._parts = Counter()     # Partition -> wartende Zeilen
+        self.stats = {"depth": 0, "max_depth": 0, "batches": 0, "rows": 0,
+                      "last_ms": 0.0, "max_ms": 0.0, "errors": 0}
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name=f"quiz-writer:{storage.data_dir}", daemon=True)
+        self._thread.start()
+
+    def put(self, row, table):
+        with self._cond:
+            self._queue.append((time.monotonic(), table, row))
+            self._enqueued += 1
+            if table in KEYS:
+                self._keys.add((table, member_key(row[k] for k in KEYS[table])))
+            self._parts[partition_name(table, row["round_id"])] += 1
+            self.stats["depth"] = len(self._queue)
+            self.stats["max_depth"] = max(self.stats["max_depth"], len(self._queue))
+            self._cond.notify_all()
+
+    def pending_key(self, table, key):
+        return (table, key) in self._keys
+
+    def has_pending(self, name):
+        return self._parts.get(name, 0) > 0
+
+    def flush(self, timeout=FLUSH_TIMEOUT_SEC):
+        # Wartet, bis alles bis jetzt Eingereichte auf der Platte ist
+        with self._cond:
+            target = self._enqueued
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._flushed >= target, timeout)
+
+    def close(self, timeout=FLUSH_TIMEOUT_SEC):
+        # Restliche Einreichungen schreiben, dann den Thread beenden (Storage.close)
+        ok = self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        return ok
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+            time.sleep(self.delay)
+            with self._cond:
+                batch, self._queue = self._queue, []
+            by_table = {}
+            for _, table, row in batch:
+                by_table.setdefault(table, []).append(row)
+            done, failed = set(), False
+            try:
+                for table, rows in by_table.items():
+                    self.storage.append_rows(rows, table)
+                    done.add(table)
+            except Exception:
+                # nichts verlieren: nicht geschriebene Tabellen zurück an den Anfang der
+                # Queue, später erneut; geschriebene nicht doppelt anhängen
+                with self._cond:
+                    self._queue[:0] = [item for item in batch if item[1] not in done]
+                    self.stats["errors"] += 1
+                batch, failed = [item for item in batch if item[1] in done], True
+                if self._closed:
+                    return  # beim Beenden nicht endlos wiederholen; das Event-Log hat die Zeilen
+                if not batch:
+                    time.sleep(RETRY_SEC)
+                    continue
+            latency_ms = (time.monotonic() - batch[0][0]) * 1000
+            with self._cond:
+                for _, table, row in batch:
+                    if table in KEYS:
+                        self._keys.discard((table, member_key(row[k] for k in KEYS[table])))
+                    name = partition_name(table, row["round_id"])
+                    self._parts[name] -= 1
+                    if self._parts[name] <= 0:
+                        del self._parts[name]
+                self._flushed += len(batch)
+                self.stats.update(depth=len(self._queue), batches=self.stats["batches"] + 1,
+                                  rows=self.stats["rows"] + len(batch), last_ms=round(latency_ms, 2),
+                                  max_ms=round(max(self.stats["max_ms"], latency_ms), 2))
+                self._cond.notify_all()
+            if failed:
+                time.sleep(RETRY_SEC)